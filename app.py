@@ -9,6 +9,11 @@ import psycopg2
 
 from models.models import db, User, UserProfile, UserPhoto, LunchPreference, UserAvailability, Restaurant, LunchMeeting, Notification
 from config import config
+from services.discover_deck import init_deck_store
+from services.user_cards import init_card_cache
+from services.pair_scores import init_pair_score_cache
+from services.candidate_shards import init_candidate_shards, warm_candidate_shards
+from services.vocabulary import CUISINES, VocabularyFull
 
 # Load environment variables
 load_dotenv()
@@ -25,6 +30,10 @@ def create_app(config_name='default'):
     
     # Initialize extensions
     db.init_app(app)
+    init_deck_store(app)
+    init_card_cache(app)
+    init_pair_score_cache(app)
+    init_candidate_shards(app)
     
     # Setup Flask-Login
     login_manager = LoginManager()
@@ -71,6 +80,18 @@ def create_app(config_name='default'):
     # Create database tables
     with app.app_context():
         db.create_all()
+        
+        # Give every curated cuisine its mask bit
+        try:
+            CUISINES.seed()
+            db.session.commit()
+        except VocabularyFull as e:
+            db.session.rollback()
+            app.logger.warning(f"{e} Run script/backfill_preference_masks.py --reset-vocabulary.")
+        
+        # Load the largest campuses before the first discover request needs them
+        if app.config['CANDIDATE_SHARD_WARM_MIN_USERS']:
+            warm_candidate_shards(app.config['CANDIDATE_SHARD_WARM_MIN_USERS'])
     
     return app
 
@@ -11,6 +11,40 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
     # Use a single database URI for all environments
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI', 'postgresql://localhost/lunchapp2')
+    # Seconds a ranked discover deck is reused before candidates are scored again
+    DISCOVER_DECK_TTL = int(os.getenv('DISCOVER_DECK_TTL', 15 * 60))
+    # Candidates whose scores fall in the same band of this many points are shuffled together in a discover deck
+    DISCOVER_SCORE_BAND = int(os.getenv('DISCOVER_SCORE_BAND', 10))
+    # Seconds each user's deck shuffle is kept, so decks rebuilt within the period keep their order
+    DISCOVER_SHUFFLE_PERIOD = int(os.getenv('DISCOVER_SHUFFLE_PERIOD', 24 * 60 * 60))
+    # Live discover ranking: 'python' scores the university's candidates in process, 'sql' ranks them in the database
+    DISCOVER_SCORING = os.getenv('DISCOVER_SCORING', 'python')
+    # Candidates read per query when discover is ranked in the database
+    DISCOVER_SQL_PAGE_SIZE = int(os.getenv('DISCOVER_SQL_PAGE_SIZE', 500))
+    # Server-side deck store: 'memory' (per process) or 'sqlite' (shared by processes on one node)
+    DISCOVER_DECK_STORE = os.getenv('DISCOVER_DECK_STORE', 'memory')
+    DISCOVER_DECK_STORE_PATH = os.getenv('DISCOVER_DECK_STORE_PATH', 'discover_decks.sqlite3')
+    DISCOVER_DECK_STORE_MAX_ENTRIES = int(os.getenv('DISCOVER_DECK_STORE_MAX_ENTRIES', 10000))
+    # Seconds an idle discover session's deck and served users are kept before eviction
+    DISCOVER_STORE_TTL = int(os.getenv('DISCOVER_STORE_TTL', 12 * 60 * 60))
+    # Candidates kept per user by script/compute_recommendations.py
+    RECOMMENDATIONS_TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', 200))
+    # Seconds precomputed recommendations are served before discover falls back to live scoring
+    RECOMMENDATIONS_MAX_AGE = int(os.getenv('RECOMMENDATIONS_MAX_AGE', 60 * 60))
+    # Discover cards cached per process, reused until the user's profile or preferences change
+    USER_CARD_CACHE_MAX_ENTRIES = int(os.getenv('USER_CARD_CACHE_MAX_ENTRIES', 20000))
+    # Pair compatibility results cached per process, reused until either user's preferences or availability change
+    PAIR_SCORE_CACHE_MAX_ENTRIES = int(os.getenv('PAIR_SCORE_CACHE_MAX_ENTRIES', 200000))
+    # Seconds a university's in-memory candidate features are scored against before they are reloaded
+    CANDIDATE_SHARD_TTL = int(os.getenv('CANDIDATE_SHARD_TTL', 5 * 60))
+    # Users held across all universities' candidate features before the least recently used are evicted
+    CANDIDATE_SHARD_MAX_USERS = int(os.getenv('CANDIDATE_SHARD_MAX_USERS', 200000))
+    # Universities with at least this many users are loaded at startup and never evicted, 0 to turn off
+    CANDIDATE_SHARD_WARM_MIN_USERS = int(os.getenv('CANDIDATE_SHARD_WARM_MIN_USERS', 0))
+    # Most recent messages shown when a conversation opens, and the most each "load older" request returns
+    CONVERSATION_PAGE_SIZE = int(os.getenv('CONVERSATION_PAGE_SIZE', 50))
+    # Seconds before the in-memory restaurant index is reloaded to pick up other processes' changes
+    RESTAURANT_INDEX_TTL = int(os.getenv('RESTAURANT_INDEX_TTL', 5 * 60))
 
 class DevelopmentConfig(Config):
     DEBUG = True
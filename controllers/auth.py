@@ -5,6 +5,7 @@ from datetime import datetime
 
 from models.models import db, User, UserProfile
 from forms.auth_forms import LoginForm, RegistrationForm
+from services.candidate_shards import candidate_shards
 
 auth = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -55,6 +56,7 @@ def register():
         
         db.session.add(user)
         db.session.commit()
+        candidate_shards().invalidate_user(user.id, profile.university)
         
         flash('Congratulations, you are now a registered user!', 'success')
         return redirect(url_for('auth.login'))
@@ -1,80 +1,64 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
-from datetime import datetime
-from sqlalchemy import and_, or_, desc, func
+from sqlalchemy import and_, desc, func, case
 import random
 
 from models.models import db, User, UserProfile, UserPhoto, matches, ConversationStarter, LunchPreference, CuisinePreference, Restaurant
-
-# For a real application, we'd create a proper Message model
-# For simplicity in this prototype, we'll add a basic messages table
-class Message(db.Model):
-    __tablename__ = 'messages'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    sender_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    
-    # Relationship
-    sender = db.relationship('User', foreign_keys=[sender_id], backref=db.backref('sent_messages', cascade='all, delete-orphan'))
-    receiver = db.relationship('User', foreign_keys=[receiver_id], backref=db.backref('received_messages', cascade='all, delete-orphan'))
-    
-    def __repr__(self):
-        return f'<Message {self.id} from {self.sender_id} to {self.receiver_id}>'
+from models.models import Message, ConversationThread
+from services.compatibility import load_user_features, overlapping_availability, restaurant_request
+from services.restaurants import recommend_restaurants
+from services.pair_scores import load_stamps, pair_score_cache
+from services.messaging import record_message, mark_read, message_page
 
 messaging = Blueprint('messaging', __name__, url_prefix='/messaging')
 
 @messaging.route('/conversations')
 @login_required
 def conversations():
-    # Get all matched users
-    matched_records = db.session.query(matches).filter(
-        matches.c.user_id == current_user.id,
-        matches.c.status == 'matched'
-    ).all()
-    
-    matched_user_ids = [m.matched_user_id for m in matched_records]
-    matched_users = User.query.filter(User.id.in_(matched_user_ids)).all()
+    """Inbox of matched users, most recent conversation first"""
+    thread = ConversationThread.__table__
+    other_user_id = matches.c.matched_user_id
+    
+    # Every matched user with their thread summary, last message and photo in one query.
+    # Threads are found by primary key whichever of the two users has the lower id
+    rows = db.session.query(
+        User,
+        UserProfile,
+        UserPhoto.photo_path,
+        Message,
+        case((thread.c.user1_id == current_user.id, thread.c.user1_unread), else_=thread.c.user2_unread)
+    ).select_from(matches).\
+        join(User, User.id == other_user_id).\
+        outerjoin(UserProfile, UserProfile.user_id == User.id).\
+        outerjoin(UserPhoto, and_(UserPhoto.user_id == User.id, UserPhoto.is_primary == True)).\
+        outerjoin(thread, and_(
+            thread.c.user1_id == case((other_user_id < current_user.id, other_user_id), else_=current_user.id),
+            thread.c.user2_id == case((other_user_id < current_user.id, current_user.id), else_=other_user_id)
+        )).\
+        outerjoin(Message, Message.id == thread.c.last_message_id).\
+        filter(
+            matches.c.user_id == current_user.id,
+            matches.c.status == 'matched'
+        ).\
+        order_by(thread.c.last_message_at.is_(None), desc(thread.c.last_message_at), User.id).\
+        all()
     
-    # Get last message and unread count for each conversation
     conversations = []
-    for user in matched_users:
-        # Get the last message
-        last_message = Message.query.filter(
-            or_(
-                and_(Message.sender_id == current_user.id, Message.receiver_id == user.id),
-                and_(Message.sender_id == user.id, Message.receiver_id == current_user.id)
-            )
-        ).order_by(desc(Message.created_at)).first()
-        
-        # Get unread count
-        unread_count = Message.query.filter_by(
-            sender_id=user.id,
-            receiver_id=current_user.id,
-            is_read=False
-        ).count()
-        
-        # Get user photo
-        primary_photo = UserPhoto.query.filter_by(user_id=user.id, is_primary=True).first()
-        photo_url = primary_photo.photo_path if primary_photo else 'images/default-profile.png'
+    seen_user_ids = set()
+    for user, profile, photo_path, last_message, unread_count in rows:
+        # A user with several primary photos is listed once
+        if user.id in seen_user_ids:
+            continue
+        seen_user_ids.add(user.id)
         
         conversations.append({
             'user': user,
-            'profile': user.profile,
-            'photo_url': photo_url,
+            'profile': profile,
+            'photo_url': photo_path or 'images/default-profile.png',
             'last_message': last_message,
-            'unread_count': unread_count
+            'unread_count': unread_count or 0
         })
     
-    # Sort conversations by last message time, newest first
-    conversations.sort(
-        key=lambda x: x['last_message'].created_at if x['last_message'] else datetime.min, 
-        reverse=True
-    )
-    
     return render_template('messaging/conversations.html', conversations=conversations)
 
 @messaging.route('/conversation/<int:user_id>', methods=['GET', 'POST'])
@@ -106,6 +90,8 @@ def conversation(user_id):
                 content=content.strip()
             )
             db.session.add(message)
+            db.session.flush()
+            record_message(message)
             db.session.commit()
             
             # If AJAX request, return the message
@@ -118,24 +104,11 @@ def conversation(user_id):
                 })
     
     # Mark all messages from this user as read
-    unread_messages = Message.query.filter_by(
-        sender_id=user_id,
-        receiver_id=current_user.id,
-        is_read=False
-    ).all()
-    
-    for message in unread_messages:
-        message.is_read = True
-    
+    mark_read(current_user.id, user_id)
     db.session.commit()
     
-    # Get all messages between the two users
-    messages = Message.query.filter(
-        or_(
-            and_(Message.sender_id == current_user.id, Message.receiver_id == user_id),
-            and_(Message.sender_id == user_id, Message.receiver_id == current_user.id)
-        )
-    ).order_by(Message.created_at).all()
+    # Get the most recent messages between the two users, older ones load on request
+    messages, has_older = message_page(current_user.id, user_id, current_app.config['CONVERSATION_PAGE_SIZE'])
     
     # Get user info and primary photo in a single query with join
     user_with_photo = db.session.query(User, UserPhoto).\
@@ -151,17 +124,27 @@ def conversation(user_id):
     # Get suggested conversation starters
     conversation_starters = get_conversation_starters_for_user(user_id)
     
-    # Get common availability between users
-    common_availability = get_common_availability(current_user.id, user_id)
-    
-    # Get recommended restaurants based on common preferences
-    recommended_restaurants = get_recommended_restaurants(current_user.id, user_id)
+    # Common availability and food preferences only change when either user
+    # edits their availability or preferences, so they are cached per pair
+    stamps = load_stamps([current_user.id, user_id])
+    cache = pair_score_cache()
+    compatibility = cache.get('conversation', current_user.id, stamps.get(current_user.id), user_id, stamps.get(user_id))
+    if compatibility is None:
+        features = load_user_features([current_user.id, user_id])
+        compatibility = (overlapping_availability(features[current_user.id], features[user_id]),
+                         restaurant_request(features[current_user.id], features[user_id], fallback=True))
+        cache.put('conversation', current_user.id, stamps.get(current_user.id), user_id, stamps.get(user_id), compatibility)
+    common_availability, (cuisine_list, price_cap) = compatibility
+    
+    # Get top 5 recommended restaurants based on common preferences
+    recommended_restaurants = recommend_restaurants([(cuisine_list, price_cap)], 5)[0] if cuisine_list else []
     
     return render_template('messaging/conversation.html', 
                           user=user, 
                           profile=user.profile,
                           photo_url=photo_url,
                           messages=messages,
+                          has_older=has_older,
                           conversation_starters=conversation_starters,
                           common_availability=common_availability,
                           recommended_restaurants=recommended_restaurants)
@@ -180,9 +163,7 @@ def poll_messages(user_id):
     ).order_by(Message.created_at).all()
     
     # Mark messages as read
-    for message in new_messages:
-        message.is_read = True
-    
+    mark_read(current_user.id, user_id, [message.id for message in new_messages])
     db.session.commit()
     
     # Format messages for JSON response
@@ -195,6 +176,30 @@ def poll_messages(user_id):
     
     return jsonify(messages_data)
 
+@messaging.route('/api/messages/<int:user_id>/history', methods=['GET'])
+@login_required
+def message_history(user_id):
+    """API endpoint to load the messages older than before_id, newest page first"""
+    before_id = request.args.get('before_id', type=int)
+    if before_id is None:
+        return jsonify({'success': False, 'message': 'Expected the id of the oldest message loaded as before_id'}), 400
+    
+    page_size = current_app.config['CONVERSATION_PAGE_SIZE']
+    limit = min(max(request.args.get('limit', page_size, type=int), 1), page_size)
+    
+    messages, has_older = message_page(current_user.id, user_id, limit, before_id)
+    
+    return jsonify({
+        'success': True,
+        'messages': [{
+            'id': message.id,
+            'content': message.content,
+            'created_at': message.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'is_sender': message.sender_id == current_user.id
+        } for message in messages],
+        'has_older': has_older
+    })
+
 @messaging.route('/api/conversation_starters/<int:user_id>', methods=['GET'])
 @login_required
 def get_conversation_starters(user_id):
@@ -246,108 +251,3 @@ def get_conversation_starters_for_user(user_id):
     
     # Convert to dictionary for easier use in template
     return [{'id': s.question_id, 'question': s.question, 'category': s.category} for s in starters]
-
-def get_common_availability(user1_id, user2_id):
-    """Find common availability times between two users"""
-    from models.models import UserAvailability
-    
-    # Query both users' availability in a single query
-    availabilities = db.session.query(
-        UserAvailability.user_id,
-        UserAvailability.day_of_week,
-        UserAvailability.start_time,
-        UserAvailability.end_time
-    ).filter(
-        UserAvailability.user_id.in_([user1_id, user2_id])
-    ).all()
-    
-    # Separate the results by user
-    user1_availability = [a for a in availabilities if a.user_id == user1_id]
-    user2_availability = [a for a in availabilities if a.user_id == user2_id]
-    
-    # Convert to days
-    days = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday', 3: 'Thursday', 4: 'Friday', 5: 'Saturday', 6: 'Sunday'}
-    
-    # Build availability map for each user by day
-    user1_avail_map = {}
-    for avail in user1_availability:
-        day = days[avail.day_of_week]
-        if day not in user1_avail_map:
-            user1_avail_map[day] = []
-        user1_avail_map[day].append({'start': avail.start_time, 'end': avail.end_time})
-    
-    user2_avail_map = {}
-    for avail in user2_availability:
-        day = days[avail.day_of_week]
-        if day not in user2_avail_map:
-            user2_avail_map[day] = []
-        user2_avail_map[day].append({'start': avail.start_time, 'end': avail.end_time})
-    
-    # Find overlapping times
-    common_times = {}
-    for day in days.values():
-        if day in user1_avail_map and day in user2_avail_map:
-            common_times[day] = []
-            for time1 in user1_avail_map[day]:
-                for time2 in user2_avail_map[day]:
-                    # Check for overlap
-                    latest_start = max(time1['start'], time2['start'])
-                    earliest_end = min(time1['end'], time2['end'])
-                    if latest_start < earliest_end:
-                        common_times[day].append({
-                            'start': latest_start.strftime('%I:%M %p'),
-                            'end': earliest_end.strftime('%I:%M %p')
-                        })
-    
-    return common_times 
-
-def get_recommended_restaurants(user1_id, user2_id):
-    """Get recommended restaurants based on common food preferences between two users"""
-    from models.models import Restaurant, LunchPreference, CuisinePreference
-    from sqlalchemy import or_
-    
-    # Get both users' lunch preferences
-    user1_preferences = LunchPreference.query.filter_by(user_id=user1_id).first()
-    user2_preferences = LunchPreference.query.filter_by(user_id=user2_id).first()
-    
-    if not user1_preferences or not user2_preferences:
-        return []
-    
-    # Get cuisine preferences for both users
-    user1_cuisines = [cp.cuisine_type.lower() for cp in user1_preferences.cuisine_preferences]
-    user2_cuisines = [cp.cuisine_type.lower() for cp in user2_preferences.cuisine_preferences]
-    
-    # Find common cuisines
-    common_cuisines = set(user1_cuisines).intersection(set(user2_cuisines))
-    
-    # If no common cuisines, return recommendations from all their cuisines
-    cuisine_list = list(common_cuisines) if common_cuisines else list(set(user1_cuisines + user2_cuisines))
-    
-    if not cuisine_list:
-        return []
-    
-    # Find restaurants within budget constraints
-    max_budget = min(
-        user1_preferences.max_budget or float('inf'),
-        user2_preferences.max_budget or float('inf')
-    )
-    
-    restaurant_query = Restaurant.query
-    
-    # Apply cuisine filter
-    cuisine_filters = []
-    for cuisine in cuisine_list:
-        cuisine_filters.append(Restaurant.cuisine_type.ilike(f'%{cuisine}%'))
-    
-    if cuisine_filters:
-        restaurant_query = restaurant_query.filter(or_(*cuisine_filters))
-    
-    # Apply budget filter
-    if max_budget != float('inf'):
-        max_price_range = min(5, int(max_budget / 20) + 1)
-        restaurant_query = restaurant_query.filter(Restaurant.price_range <= max_price_range)
-    
-    # Get top 5 recommended restaurants
-    recommended_restaurants = restaurant_query.order_by(Restaurant.rating.desc()).limit(5).all()
-    
-    return recommended_restaurants 
\ No newline at end of file
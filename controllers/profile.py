@@ -8,6 +8,11 @@ import uuid
 from models.models import db, User, UserProfile, UserPhoto, LunchPreference, UserAvailability
 from models.models import CuisinePreference, DietaryRestriction
 from forms.profile_forms import ProfileForm, PhotoUploadForm, PreferencesForm, AvailabilityForm
+from services.availability import sync_availability_bitmap
+from services.candidate_shards import candidate_shards
+from services.pair_scores import pair_score_cache
+from services.user_cards import touch_card
+from services.vocabulary import CUISINES, RESTRICTIONS, normalize_name
 
 profile = Blueprint('profile', __name__, url_prefix='/profile')
 
@@ -31,6 +36,7 @@ def edit_profile():
     form = ProfileForm(obj=current_user.profile)
     
     if form.validate_on_submit():
+        old_university = current_user.profile.university
         current_user.profile.first_name = form.first_name.data
         current_user.profile.last_name = form.last_name.data
         current_user.profile.university = form.university.data
@@ -40,6 +46,7 @@ def edit_profile():
         current_user.profile.updated_at = datetime.utcnow()
         
         db.session.commit()
+        candidate_shards().invalidate_user(current_user.id, old_university, current_user.profile.university)
         flash('Your profile has been updated.', 'success')
         return redirect(url_for('profile.view_profile'))
     
@@ -70,6 +77,7 @@ def manage_photos():
                              is_primary=is_primary)
             
             db.session.add(photo)
+            touch_card(current_user)
             db.session.commit()
             
             flash('Photo uploaded successfully.', 'success')
@@ -95,6 +103,7 @@ def set_primary_photo(photo_id):
     
     # Set selected photo as primary
     photo.is_primary = True
+    touch_card(current_user)
     db.session.commit()
     
     flash('Primary photo updated.', 'success')
@@ -123,6 +132,7 @@ def delete_photo(photo_id):
         os.remove(file_path)
     
     db.session.delete(photo)
+    touch_card(current_user)
     db.session.commit()
     
     flash('Photo deleted.', 'success')
@@ -145,14 +155,23 @@ def manage_preferences():
     
     form = PreferencesForm(obj=preferences)
     
+    # Offer the curated lists, plus any older names the user saved so they can be removed
+    saved_cuisines = CUISINES.resolve([cp.cuisine_type for cp in preferences.cuisine_preferences])
+    saved_restrictions = RESTRICTIONS.resolve([dr.restriction_type for dr in preferences.dietary_restrictions])
+    form.cuisine_preferences.choices = CUISINES.form_choices(saved_cuisines)
+    form.dietary_restrictions.choices = RESTRICTIONS.form_choices(saved_restrictions)
+    
     if form.validate_on_submit():
+        cuisines = CUISINES.resolve(form.cuisine_preferences.data)
+        restrictions = RESTRICTIONS.resolve(form.dietary_restrictions.data)
+        
         # Update basic preferences
         preferences.max_budget = form.max_budget.data
         preferences.preferred_group_size = form.preferred_group_size.data
         preferences.updated_at = datetime.utcnow()
         
         # Update cuisine preferences
-        cuisines = [cuisine.strip() for cuisine in form.cuisine_preferences.data.split(',')] if form.cuisine_preferences.data else []
+        cuisine_names = {normalize_name(cuisine) for cuisine in cuisines}
         
         # Get all current cuisine preferences in a single query
         existing_cuisines = db.session.query(CuisinePreference).\
@@ -160,11 +179,11 @@ def manage_preferences():
             all()
         
         # Create a set of existing cuisine types for faster lookups
-        existing_cuisine_types = {c.cuisine_type for c in existing_cuisines}
+        existing_cuisine_types = {normalize_name(c.cuisine_type) for c in existing_cuisines}
         
         # Add new cuisines
         for cuisine in cuisines:
-            if cuisine not in existing_cuisine_types:
+            if normalize_name(cuisine) not in existing_cuisine_types:
                 new_cuisine = CuisinePreference(
                     lunch_preference_id=preferences.id,
                     cuisine_type=cuisine
@@ -173,36 +192,40 @@ def manage_preferences():
         
         # Remove cuisines that were unchecked
         for cuisine_pref in existing_cuisines:
-            if cuisine_pref.cuisine_type not in cuisines:
+            if normalize_name(cuisine_pref.cuisine_type) not in cuisine_names:
                 db.session.delete(cuisine_pref)
         
         # Update dietary restrictions
-        restrictions = [restriction.strip() for restriction in form.dietary_restrictions.data.split(',')] if form.dietary_restrictions.data else []
-        
-        # Delete all existing dietary restrictions
-        db.session.query(DietaryRestriction).\
+        restriction_names = {normalize_name(restriction) for restriction in restrictions}
+        existing_restrictions = db.session.query(DietaryRestriction).\
             filter(DietaryRestriction.lunch_preference_id == preferences.id).\
-            delete()
+            all()
+        existing_restriction_types = {normalize_name(r.restriction_type) for r in existing_restrictions}
         
         # Add new restrictions
         for restriction in restrictions:
-            if restriction:  # Skip empty strings
+            if normalize_name(restriction) not in existing_restriction_types:
                 new_restriction = DietaryRestriction(
                     lunch_preference_id=preferences.id,
                     restriction_type=restriction
                 )
                 db.session.add(new_restriction)
         
+        # Remove restrictions that were cleared
+        for restriction_pref in existing_restrictions:
+            if normalize_name(restriction_pref.restriction_type) not in restriction_names:
+                db.session.delete(restriction_pref)
+        
+        pair_score_cache().invalidate(current_user.id)
         db.session.commit()
+        candidate_shards().invalidate_user(current_user.id, current_user.profile.university)
         flash('Your lunch preferences have been updated.', 'success')
         return redirect(url_for('profile.view_profile'))
     
     # Get current selections for the form
-    if preferences.cuisine_preferences:
-        form.cuisine_preferences.data = ', '.join([cp.cuisine_type for cp in preferences.cuisine_preferences])
-    
-    if preferences.dietary_restrictions:
-        form.dietary_restrictions.data = ', '.join([dr.restriction_type for dr in preferences.dietary_restrictions])
+    if request.method == 'GET':
+        form.cuisine_preferences.data = saved_cuisines
+        form.dietary_restrictions.data = saved_restrictions
     
     return render_template('profile/preferences.html', form=form, preferences=preferences)
 
@@ -231,7 +254,11 @@ def manage_availability():
             )
             
             db.session.add(availability)
+            sync_availability_bitmap(current_user)
+            touch_card(current_user)
+            pair_score_cache().invalidate(current_user.id)
             db.session.commit()
+            candidate_shards().invalidate_user(current_user.id, current_user.profile.university)
             flash('Availability added.', 'success')
         
         return redirect(url_for('profile.manage_availability'))
@@ -252,7 +279,11 @@ def delete_availability(availability_id):
         return redirect(url_for('profile.manage_availability'))
     
     db.session.delete(availability)
+    sync_availability_bitmap(current_user)
+    touch_card(current_user)
+    pair_score_cache().invalidate(current_user.id)
     db.session.commit()
+    candidate_shards().invalidate_user(current_user.id, current_user.profile.university)
     
     flash('Availability deleted.', 'success')
     return redirect(url_for('profile.manage_availability')) 
\ No newline at end of file
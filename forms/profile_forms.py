@@ -26,10 +26,11 @@ class MultiCheckboxField(SelectMultipleField):
     option_widget = widgets.CheckboxInput()
 
 class PreferencesForm(FlaskForm):
-    cuisine_preferences = StringField('Cuisine Preferences', validators=[Optional()],
-                                      description='Enter cuisines separated by commas (e.g., Italian, Chinese, Mexican)')
-    dietary_restrictions = StringField('Dietary Restrictions', validators=[Optional()],
-                                       description='Enter dietary restrictions separated by commas (e.g., Vegan, Gluten Free)')
+    # Choices come from services.vocabulary and are set by the view
+    cuisine_preferences = SelectMultipleField('Cuisine Preferences', choices=[], validators=[Optional()],
+                                              description='Pick the cuisines you enjoy (e.g., Italian, Chinese, Mexican)')
+    dietary_restrictions = SelectMultipleField('Dietary Restrictions', choices=[], validators=[Optional()],
+                                               description='Pick any dietary restrictions (e.g., Vegan, Gluten-Free)')
     max_budget = FloatField('Maximum Budget ($)', validators=[Optional(), NumberRange(min=0)])
     preferred_group_size = SelectField('Preferred Group Size', 
                                       choices=[(1, 'One-on-one'), (2, 'Small group (3-4)'), (3, 'Large group (5+)')],
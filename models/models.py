@@ -1,10 +1,23 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+def normalize_university(name):
+    """Key that groups spellings of one university: casefolded with single spaces"""
+    return ' '.join(name.split()).casefold()
+
+def _default_university_key(context):
+    # Bulk inserts that only set university still get a key
+    return normalize_university(context.get_current_parameters()['university'])
+
+# Raised by every UPDATE of a row, so caches can tell edits apart even when
+# they land within the resolution of updated_at
+_NEXT_VERSION = db.literal_column('version') + 1
+
 # Association table for matches (many-to-many relationship)
 matches = db.Table('matches',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
@@ -78,11 +91,22 @@ class UserProfile(db.Model):
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
     university = db.Column(db.String(100), nullable=False)
+    university_key = db.Column(db.String(100), nullable=False, default=_default_university_key)
     department = db.Column(db.String(100), nullable=True)
     bio = db.Column(db.Text, nullable=True)
     graduation_year = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, onupdate=_NEXT_VERSION, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_user_profiles_university_key_user_id', 'university_key', 'user_id'),
+    )
+    
+    @validates('university')
+    def _set_university_key(self, key, university):
+        self.university_key = normalize_university(university)
+        return university
     
     def __repr__(self):
         return f'<UserProfile {self.first_name} {self.last_name}>'
@@ -110,6 +134,9 @@ class LunchPreference(db.Model):
     preferred_group_size = db.Column(db.Integer, default=2, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, onupdate=_NEXT_VERSION, nullable=False)
+    # One bit per CuisineType id, kept in sync by services.vocabulary
+    cuisine_mask = db.Column(db.BigInteger, default=0, nullable=False)
     
     # Relationships
     cuisine_preferences = db.relationship('CuisinePreference', backref='lunch_preference', cascade='all, delete-orphan')
@@ -130,6 +157,17 @@ class LunchPreference(db.Model):
     def __repr__(self):
         return f'<LunchPreference {self.id} for user {self.user_id}>'
 
+# CuisineType table - curated cuisine vocabulary, id n owns bit n-1 of LunchPreference.cuisine_mask
+class CuisineType(db.Model):
+    __tablename__ = 'cuisine_types'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(50), nullable=False)  # Display name as listed when seeded
+    normalized_name = db.Column(db.String(50), nullable=False, unique=True)
+    
+    def __repr__(self):
+        return f'<CuisineType {self.id} {self.name}>'
+
 # CuisinePreference table - stores user cuisine preferences
 class CuisinePreference(db.Model):
     __tablename__ = 'cuisine_preferences'
@@ -186,6 +224,30 @@ class UserAvailability(db.Model):
     def __repr__(self):
         return f'<UserAvailability day={self.day_of_week}, time={self.start_time}-{self.end_time}>'
 
+# AvailabilityBitmap table - one day of a user's availability as 15-minute slot bits
+class AvailabilityBitmap(db.Model):
+    __tablename__ = 'availability_bitmaps'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day_of_week = db.Column(db.Integer, primary_key=True)  # 0=Monday, 6=Sunday
+    am_slots = db.Column(db.BigInteger, nullable=False, default=0)  # Bit n = 00:00 + 15n minutes, 48 slots
+    pm_slots = db.Column(db.BigInteger, nullable=False, default=0)  # Bit n = 12:00 + 15n minutes, 48 slots
+
+    def __repr__(self):
+        return f'<AvailabilityBitmap user={self.user_id}, day={self.day_of_week}>'
+
+# SeenContainer table - the users a user has swiped on whose ids share the same upper 16 bits, roaring-style
+class SeenContainer(db.Model):
+    __tablename__ = 'seen_containers'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    high = db.Column(db.Integer, primary_key=True)  # Swiped user id >> 16
+    cardinality = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)  # Sorted uint16 low bits, or a 65536-bit bitmap past 4096 ids
+
+    def __repr__(self):
+        return f'<SeenContainer user={self.user_id}, high={self.high}, {self.cardinality} ids>'
+
 # Restaurant table - stores information about restaurants
 class Restaurant(db.Model):
     __tablename__ = 'restaurants'
@@ -248,4 +310,53 @@ class ConversationStarter(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
     def __repr__(self):
-        return f'<ConversationStarter {self.question_id}: {self.question[:30]}...>' 
\ No newline at end of file
+        return f'<ConversationStarter {self.question_id}: {self.question[:30]}...>' 
+
+# Messages table - messages exchanged between matched users
+class Message(db.Model):
+    __tablename__ = 'messages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Each direction of a conversation is read newest first by (created_at, id)
+    __table_args__ = (
+        db.Index('ix_messages_sender_id_receiver_id_created_at_id', 'sender_id', 'receiver_id', 'created_at', 'id'),
+    )
+    
+    # Relationship
+    sender = db.relationship('User', foreign_keys=[sender_id], backref=db.backref('sent_messages', cascade='all, delete-orphan'))
+    receiver = db.relationship('User', foreign_keys=[receiver_id], backref=db.backref('received_messages', cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<Message {self.id} from {self.sender_id} to {self.receiver_id}>'
+
+# ConversationThreads table - summary of the messages between two users, one row per pair with user1_id < user2_id
+class ConversationThread(db.Model):
+    __tablename__ = 'conversation_threads'
+    
+    user1_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    user2_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id', ondelete='SET NULL'), nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    user1_unread = db.Column(db.Integer, nullable=False, default=0)  # Messages to user1 not read yet
+    user2_unread = db.Column(db.Integer, nullable=False, default=0)  # Messages to user2 not read yet
+    
+    def __repr__(self):
+        return f'<ConversationThread {self.user1_id} and {self.user2_id}, last message {self.last_message_id}>'
+
+# Recommendation table - a user's precomputed top discover candidates, written by script/compute_recommendations.py
+class Recommendation(db.Model):
+    __tablename__ = 'recommendations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    candidate_ids = db.Column(db.LargeBinary, nullable=False)  # int32 user ids in deck order
+    scores = db.Column(db.LargeBinary, nullable=False)  # int32 scores matching candidate_ids
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<Recommendation for user {self.user_id} at {self.computed_at}>'
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from sqlalchemy import inspect, text
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db
+
+# Tables whose rows carry the version that card and pair score stamps are read from
+VERSIONED_TABLES = ['user_profiles', 'lunch_preferences']
+
+def add_version_columns():
+    """Add the version column to tables created before it existed"""
+    for table in VERSIONED_TABLES:
+        existing = {column['name'] for column in inspect(db.engine).get_columns(table)}
+        if 'version' not in existing:
+            print(f"Adding {table}.version...")
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+    db.session.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add the row versions that cached cards and pair scores are stamped with')
+    parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        add_version_columns()
+        print("Done")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, ConversationThread
+from services.messaging import rebuild_conversation_threads
+
+def backfill():
+    """Rebuild every conversation thread summary from the messages table"""
+    print("Rebuilding conversation threads from messages...")
+    rebuild_conversation_threads()
+    db.session.commit()
+    print(f"Rebuilt {ConversationThread.query.count()} conversation threads")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild the conversation thread summaries behind the inbox from the messages table')
+    parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        backfill()
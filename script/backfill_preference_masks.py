@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from collections import Counter
+from sqlalchemy import inspect, text
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, LunchPreference
+from services.vocabulary import CUISINES, refresh_cuisine_masks
+
+MASK_COLUMNS = ['cuisine_mask']
+
+# Columns written by earlier versions that are no longer maintained
+DROPPED_COLUMNS = ['restriction_mask']
+
+def update_mask_columns():
+    """Add the mask columns to a lunch_preferences table created before they existed, and drop retired ones"""
+    existing = {column['name'] for column in inspect(db.engine).get_columns('lunch_preferences')}
+    for column in MASK_COLUMNS:
+        if column not in existing:
+            print(f"Adding lunch_preferences.{column}...")
+            db.session.execute(text(f"ALTER TABLE lunch_preferences ADD COLUMN {column} BIGINT NOT NULL DEFAULT 0"))
+    for column in DROPPED_COLUMNS:
+        if column in existing:
+            print(f"Dropping lunch_preferences.{column}...")
+            db.session.execute(text(f"ALTER TABLE lunch_preferences DROP COLUMN {column}"))
+    db.session.commit()
+
+def seed(reset=False):
+    """Give every curated cuisine a vocabulary entry, first emptying the vocabulary with reset=True"""
+    if reset:
+        print("Emptying the cuisine vocabulary...")
+        db.session.execute(CUISINES.table.delete())
+        CUISINES.clear()
+    CUISINES.seed()
+    db.session.commit()
+
+def backfill(batch_size=1000):
+    """Rebuild every preference's cuisine mask from the seeded vocabulary"""
+    preference_ids = [row[0] for row in db.session.query(LunchPreference.id).order_by(LunchPreference.id)]
+    print(f"Rebuilding cuisine masks for {len(preference_ids)} preferences...")
+
+    unmapped = Counter()
+    for start in range(0, len(preference_ids), batch_size):
+        unmapped.update(refresh_cuisine_masks(preference_ids[start:start + batch_size]))
+        db.session.commit()
+        print(f"Rebuilt {min(start + batch_size, len(preference_ids))}/{len(preference_ids)} preferences")
+
+    # Such cuisines stay on the profile but no longer count towards food matches
+    if unmapped:
+        print(f"{sum(unmapped.values())} cuisine rows use {len(unmapped)} names outside the curated list and have no bit:")
+        for name, rows in unmapped.most_common():
+            print(f"  {name}: {rows}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Seed the cuisine vocabulary and rebuild the preference masks')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Preferences rebuilt per transaction (default: 1000)')
+    parser.add_argument('--reset-vocabulary', action='store_true',
+                        help='Rebuild the vocabulary from the curated names only, dropping free-text entries')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        update_mask_columns()
+        seed(args.reset_vocabulary)
+        backfill(args.batch_size)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, User
+from services.seen import rebuild_seen
+
+def backfill(batch_size=1000):
+    """Rebuild every user's stored seen bitmap from the matches rows of their swipes"""
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+    print(f"Rebuilding seen bitmaps for {len(user_ids)} users...")
+
+    for start in range(0, len(user_ids), batch_size):
+        rebuild_seen(user_ids[start:start + batch_size])
+        db.session.commit()
+        print(f"Rebuilt {min(start + batch_size, len(user_ids))}/{len(user_ids)} users")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild the seen bitmaps of swiped users from the matches table')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Users rebuilt per transaction (default: 1000)')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        backfill(args.batch_size)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from sqlalchemy import inspect, text, bindparam
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, UserProfile, normalize_university
+
+def add_key_column():
+    """Add user_profiles.university_key and its index to a table created before they existed"""
+    existing = {column['name'] for column in inspect(db.engine).get_columns('user_profiles')}
+    if 'university_key' not in existing:
+        print("Adding user_profiles.university_key...")
+        db.session.execute(text("ALTER TABLE user_profiles ADD COLUMN university_key VARCHAR(100)"))
+    db.session.commit()
+
+def backfill(batch_size=1000):
+    """Set the university key of every profile from its university name"""
+    universities = [row[0] for row in db.session.query(UserProfile.university).distinct()]
+    print(f"Setting university keys for {len(universities)} distinct university names...")
+
+    statement = UserProfile.__table__.update().\
+        where(UserProfile.__table__.c.university == bindparam('name')).\
+        values(university_key=bindparam('key'))
+    for start in range(0, len(universities), batch_size):
+        db.session.execute(statement, [{'name': name, 'key': normalize_university(name)}
+                                       for name in universities[start:start + batch_size]])
+        db.session.commit()
+
+def add_key_index():
+    """Create the (university_key, user_id) index and, on PostgreSQL, make the key required"""
+    for index in UserProfile.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("ALTER TABLE user_profiles ALTER COLUMN university_key SET NOT NULL"))
+    db.session.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add and fill the normalized university key of every user profile')
+    parser.add_argument('--batch-size', type=int, default=1000, help='University names updated per transaction (default: 1000)')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        add_key_column()
+        backfill(args.batch_size)
+        add_key_index()
+        print("Done")
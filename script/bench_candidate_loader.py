@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import time as time_module
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import (
+    db, User, UserProfile, UserPhoto, LunchPreference, CuisinePreference,
+    DietaryRestriction, UserAvailability
+)
+from services.candidates import load_discover_candidates
+from script.seed_campus import DEFAULT_UNIVERSITY, seed_campus, campus_user_ids, remove_campus
+
+def load_flat(user_id, university):
+    """The original seven-way join, returning (rows transferred, users loaded)"""
+    rows = db.session.query(
+        User, UserProfile, UserPhoto, LunchPreference, CuisinePreference, DietaryRestriction, UserAvailability
+    ).\
+    join(UserProfile, User.id == UserProfile.user_id).\
+    outerjoin(UserPhoto, User.id == UserPhoto.user_id).\
+    outerjoin(LunchPreference, User.id == LunchPreference.user_id).\
+    outerjoin(CuisinePreference, LunchPreference.id == CuisinePreference.lunch_preference_id).\
+    outerjoin(DietaryRestriction, LunchPreference.id == DietaryRestriction.lunch_preference_id).\
+    outerjoin(UserAvailability, User.id == UserAvailability.user_id).\
+    filter(User.id != user_id, UserProfile.university == university).\
+    order_by(User.id).\
+    all()
+
+    return len(rows), len({row[0].id for row in rows})
+
+def load_batched(user_id, university):
+    """The batched loader, returning (rows transferred, users loaded)"""
+    candidates = load_discover_candidates(user_id, university)
+    rows = len(candidates)
+    for data in candidates:
+        rows += len(data['photos']) + len(data['cuisines']) + len(data['restrictions']) + len(data['availabilities'])
+        rows += 1 if data['preference'] else 0
+    return rows, len(candidates)
+
+def run(name, loader, user_id, university, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time_module.perf_counter()
+        rows, users = loader(user_id, university)
+        elapsed = time_module.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} users={users:<7} rows={rows:<9} best={best * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the flat discover join with the batched candidate loader')
+    parser.add_argument('--users', type=int, default=10000, help='Campus size to seed if missing (default: 10000)')
+    parser.add_argument('--university', default=DEFAULT_UNIVERSITY, help=f'University to benchmark (default: {DEFAULT_UNIVERSITY})')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per loader, best time is reported (default: 3)')
+    parser.add_argument('--cleanup', action='store_true', help='Remove the seeded campus afterwards')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        user_ids = campus_user_ids(args.university)
+        if len(user_ids) < args.users:
+            user_ids = seed_campus(args.university, args.users - len(user_ids))
+
+        print(f"Benchmarking discover candidate loading for {len(user_ids)} users at {args.university}")
+        run('flat join', load_flat, user_ids[0], args.university, args.repeat)
+        run('batched', load_batched, user_ids[0], args.university, args.repeat)
+
+        if args.cleanup:
+            remove_campus(args.university)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import time as time_module
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, User, UserProfile
+from services.candidate_shards import CandidateShards
+from services.candidates import load_features, not_interacted
+from services.scoring import CandidatePool
+from script.seed_campus import seed_campus, campus_user_ids, remove_campus
+
+LARGE_UNIVERSITY = "Benchmark University"
+SMALL_UNIVERSITY = "Benchmark College"
+
+def score_from_database(user_id, university, shards):
+    """The previous live path: candidate ids by an unindexed name filter, then their features"""
+    candidate_ids = [row[0] for row in db.session.query(User.id).
+                     join(UserProfile, User.id == UserProfile.user_id).
+                     filter(User.id != user_id, UserProfile.university == university, not_interacted(user_id)).
+                     order_by(User.id)]
+    pool = CandidatePool(load_features(candidate_ids))
+    pool.score(0, None, None)
+    return len(pool)
+
+def score_from_shard(user_id, university, shards):
+    """Candidates taken from the university's in-memory shard"""
+    pool = shards.shard(university).candidates(user_id)
+    pool.score(0, None, None)
+    return len(pool)
+
+def run(name, scorer, user_id, university, repeat, cold=False):
+    shards = CandidateShards()
+    best = None
+    for _ in range(repeat):
+        if cold:
+            shards = CandidateShards()
+        start = time_module.perf_counter()
+        candidates = scorer(user_id, university, shards)
+        elapsed = time_module.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<22} candidates={candidates:<7} best={best * 1000:.1f} ms")
+
+def campus(university, users):
+    user_ids = campus_user_ids(university)
+    if len(user_ids) < users:
+        user_ids = seed_campus(university, users - len(user_ids))
+    return user_ids
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare live discover scoring from the database with per-university shards')
+    parser.add_argument('--large', type=int, default=20000, help='Users on the large campus (default: 20000)')
+    parser.add_argument('--small', type=int, default=200, help='Users on the small campus (default: 200)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per path, best time is reported (default: 5)')
+    parser.add_argument('--cleanup', action='store_true', help='Remove the seeded campuses afterwards')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        campuses = [(LARGE_UNIVERSITY, campus(LARGE_UNIVERSITY, args.large)),
+                    (SMALL_UNIVERSITY, campus(SMALL_UNIVERSITY, args.small))]
+
+        for university, user_ids in campuses:
+            print(f"Live discover scoring for a user at {university} ({len(user_ids)} users)")
+            run('database', score_from_database, user_ids[0], university, args.repeat)
+            run('shard, first load', score_from_shard, user_ids[0], university, args.repeat, cold=True)
+            run('shard, loaded', score_from_shard, user_ids[0], university, args.repeat)
+
+        if args.cleanup:
+            for university, _ in campuses:
+                remove_campus(university)
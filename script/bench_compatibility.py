@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import random
+import time as time_module
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from flask import g
+from app import create_app
+from models.models import db, User
+from services.compatibility import UserFeatures, load_user_features, score_against, overlapping_availability, restaurant_request
+from services.pair_scores import PairScoreCache
+from services.scoring import CandidatePool
+from services.user_cards import CardAvailability
+from script.seed_campus import DEFAULT_UNIVERSITY, seed_campus, campus_user_ids, remove_campus
+
+def timed(name, run, calls, repeat):
+    """Run run() repeat times and print the best time per call, run() making calls calls"""
+    best = None
+    for _ in range(repeat):
+        start = time_module.perf_counter()
+        run()
+        elapsed = time_module.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<34} calls={calls:<7} best={best * 1000:.2f} ms  per call={best / calls * 1e6:.1f} us")
+
+def bench_features(app, features, repeat):
+    """Building features from loaded rows, then reading them back within one request"""
+    rows = [(f.user_id, f.stamp, f, [CardAvailability(*a) for a in f.availability]) for f in features]
+    timed('UserFeatures.build', lambda: [UserFeatures.build(user_id, stamp, preference, availability)
+                                         for user_id, stamp, preference, availability in rows],
+          len(rows), repeat)
+
+    with app.test_request_context():
+        load_user_features([f.user_id for f in features])
+        timed('load_user_features, memoized', lambda: load_user_features([f.user_id for f in features]),
+              len(features), repeat)
+
+def bench_pool(viewer, features, sizes, repeat):
+    """Vectorized scoring of pools of several sizes"""
+    for size in sizes:
+        candidates = [f.candidate for f in features[:size]]
+        timed(f'CandidatePool build, {size}', lambda: CandidatePool(candidates), 1, repeat)
+        pool = CandidatePool(candidates)
+        timed(f'CandidatePool.score, {size}', lambda: pool.score(*viewer.scoring), 1, repeat)
+
+def bench_pairs(app, viewer, features, sizes, repeat):
+    """Pair scoring with every pair missing from the cache, then with every pair cached"""
+    user = db.session.get(User, viewer.user_id)
+    cache = app.extensions['pair_score_cache']
+    for size in sizes:
+        others = [(f.user_id, f.stamp) for f in features[:size]]
+        with app.test_request_context():
+            g.user_features = {f.user_id: f for f in features[:size] + [viewer]}
+
+            def cold():
+                app.extensions['pair_score_cache'] = PairScoreCache()
+                score_against(user, others, lambda position: features[position])
+            timed(f'score_against uncached, {size}', cold, 1, repeat)
+            app.extensions['pair_score_cache'] = cache
+
+            score_against(user, others, lambda position: features[position])
+            timed(f'score_against cached, {size}', lambda: score_against(user, others, lambda position: features[position]),
+                  1, repeat)
+
+def bench_pair_functions(viewer, features, repeat):
+    """Per-pair helpers used by the matched list and conversations"""
+    timed('overlapping_availability', lambda: [overlapping_availability(viewer, f) for f in features],
+          len(features), repeat)
+    timed('restaurant_request', lambda: [restaurant_request(viewer, f) for f in features],
+          len(features), repeat)
+    timed('restaurant_request, fallback', lambda: [restaurant_request(viewer, f, fallback=True) for f in features],
+          len(features), repeat)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Microbenchmarks of feature extraction and compatibility scoring')
+    parser.add_argument('--users', type=int, default=2000, help='Campus size to seed if missing (default: 2000)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 200, 2000], help='Users scored per call (default: 10 200 2000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per benchmark, best time is reported (default: 5)')
+    parser.add_argument('--cleanup', action='store_true', help='Remove the seeded campus afterwards')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        user_ids = campus_user_ids(DEFAULT_UNIVERSITY)
+        if len(user_ids) < args.users:
+            user_ids = seed_campus(DEFAULT_UNIVERSITY, args.users - len(user_ids))
+
+        random.seed(0)
+        with app.test_request_context():
+            loaded = load_user_features(user_ids[:args.users])
+        features = [loaded[user_id] for user_id in user_ids[:args.users]]
+        viewer = random.choice(features)
+        sizes = [size for size in args.sizes if size <= len(features)]
+
+        print(f"Compatibility of user {viewer.user_id} with {len(features)} users at {DEFAULT_UNIVERSITY}")
+        bench_features(app, features, args.repeat)
+        bench_pool(viewer, features, sizes, args.repeat)
+        bench_pairs(app, viewer, features, sizes, args.repeat)
+        bench_pair_functions(viewer, features, args.repeat)
+
+        if args.cleanup:
+            remove_campus(DEFAULT_UNIVERSITY)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import random
+import time as time_module
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, LunchPreference, AvailabilityBitmap
+from services.availability import week_slots_from_bitmaps
+from services.candidate_shards import CandidateShards
+from services.discover_deck import DiscoverDeck
+from services.sql_scoring import ranked_candidates
+from script.seed_campus import DEFAULT_UNIVERSITY, seed_campus, campus_user_ids, remove_campus
+
+def viewer_features(user_id):
+    """(cuisine_mask, slots, max_budget) of a viewer from the stored columns"""
+    preference = db.session.query(LunchPreference.cuisine_mask, LunchPreference.max_budget).\
+        filter(LunchPreference.user_id == user_id).first()
+    bitmaps = db.session.query(AvailabilityBitmap.day_of_week, AvailabilityBitmap.am_slots, AvailabilityBitmap.pm_slots).\
+        filter(AvailabilityBitmap.user_id == user_id).all()
+    cuisine_mask, max_budget = preference if preference else (0, None)
+    return cuisine_mask, week_slots_from_bitmaps(bitmaps), max_budget
+
+def rank_in_python(shards, user_id, university, features, limit):
+    """The current path: score the university's shard in NumPy and rank it into a deck"""
+    pool = shards.shard(university).candidates(user_id)
+    deck = DiscoverDeck.from_scores(pool.user_ids, pool.score(*features).scores)
+    return list(zip(deck.user_ids[:limit].tolist(), deck.scores[:limit].tolist()))
+
+def rank_in_sql(shards, user_id, university, features, limit):
+    """Score in the database and only fetch the best limit rows"""
+    cuisine_mask, _, max_budget = features
+    return [(row.user_id, row.score) for row in ranked_candidates(user_id, university, cuisine_mask, max_budget, limit)]
+
+def run(name, ranker, viewers, university, limit, cold=False):
+    shards = CandidateShards()
+    shards.shard(university)
+    elapsed = []
+    for user_id, features in viewers:
+        if cold:
+            shards = CandidateShards()
+        start = time_module.perf_counter()
+        ranker(shards, user_id, university, features, limit)
+        elapsed.append(time_module.perf_counter() - start)
+    elapsed.sort()
+    print(f"{name:<22} median={elapsed[len(elapsed) // 2] * 1000:.1f} ms  max={elapsed[-1] * 1000:.1f} ms")
+
+def check(viewers, university):
+    """Compare every candidate's score from both paths"""
+    shards = CandidateShards()
+    for user_id, features in viewers:
+        in_python = dict(rank_in_python(shards, user_id, university, features, None))
+        in_sql = dict(rank_in_sql(shards, user_id, university, features, None))
+        if in_python != in_sql:
+            print(f"Scores differ for user {user_id}")
+            return False
+    print(f"Scores match for {len(viewers)} viewers")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare discover ranking in Python with ranking in the database')
+    parser.add_argument('--users', type=int, nargs='+', default=[10000, 100000], help='Campus sizes to seed and benchmark (default: 10000 100000)')
+    parser.add_argument('--viewers', type=int, default=5, help='Viewers timed per campus (default: 5)')
+    parser.add_argument('--limit', type=int, default=500, help='Candidates ranked per request (default: 500)')
+    parser.add_argument('--cleanup', action='store_true', help='Remove the seeded campuses afterwards')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        random.seed(0)
+        for users in args.users:
+            university = f"{DEFAULT_UNIVERSITY} {users}"
+            user_ids = campus_user_ids(university)
+            if len(user_ids) < users:
+                user_ids = seed_campus(university, users - len(user_ids))
+
+            viewers = [(user_id, viewer_features(user_id)) for user_id in random.sample(user_ids, args.viewers)]
+            print(f"Ranking the top {args.limit} of {len(user_ids)} users at {university}")
+            if not check(viewers, university):
+                sys.exit(1)
+            run('python, shard loaded', rank_in_python, viewers, university, args.limit)
+            run('python, first load', rank_in_python, viewers, university, args.limit, cold=True)
+            run('sql', rank_in_sql, viewers, university, args.limit)
+
+        if args.cleanup:
+            for users in args.users:
+                remove_campus(f"{DEFAULT_UNIVERSITY} {users}")
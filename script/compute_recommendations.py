@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, UserProfile
+from services.recommendations import rank_university, store_recommendations, stale_universities
+
+# Flask app of each worker process, created once by init_worker
+worker_app = None
+
+def init_worker():
+    """Give every worker process its own app and database connections"""
+    global worker_app
+    worker_app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+def compute_university(university, top_k):
+    """Rank and store the top candidates of every user at one university"""
+    started = time.perf_counter()
+    with worker_app.app_context():
+        try:
+            decks = rank_university(university, top_k)
+            store_recommendations(decks)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return university, len(decks), time.perf_counter() - started
+
+def universities_to_compute(app, stale_only):
+    """Universities to rank, largest first so the slowest tasks start early"""
+    with app.app_context():
+        if stale_only:
+            universities = stale_universities(app.config['RECOMMENDATIONS_MAX_AGE'])
+        else:
+            universities = [row[0] for row in db.session.query(UserProfile.university_key).distinct()]
+
+        sizes = dict(db.session.query(UserProfile.university_key, db.func.count(UserProfile.id)).
+                     filter(UserProfile.university_key.in_(universities)).
+                     group_by(UserProfile.university_key))
+        # Workers open their own connections, none may be shared across processes
+        db.engine.dispose()
+
+    return sorted(universities, key=lambda university: -sizes.get(university, 0))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompute every user\'s top discover candidates, one university per task')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: number of CPUs)')
+    parser.add_argument('--top-k', type=int, default=None, help='Candidates kept per user (default: RECOMMENDATIONS_TOP_K)')
+    parser.add_argument('--stale-only', action='store_true', help='Only rank universities with missing or stale recommendations')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    top_k = args.top_k or app.config['RECOMMENDATIONS_TOP_K']
+    universities = universities_to_compute(app, args.stale_only)
+    print(f"Ranking {len(universities)} universities with {args.workers} workers, top {top_k} per user...")
+
+    started = time.perf_counter()
+    failures = 0
+    # Spawned workers start clean instead of inheriting this process's connections
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=init_worker) as executor:
+        futures = {executor.submit(compute_university, university, top_k): university for university in universities}
+        for future in as_completed(futures):
+            try:
+                university, users, elapsed = future.result()
+                print(f"{university}: {users} users in {elapsed:.1f}s")
+            except Exception as e:
+                failures += 1
+                print(f"Error ranking {futures[future]}: {e}")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s, {failures} failed")
+    sys.exit(1 if failures else 0)
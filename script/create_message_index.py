@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import db, Message
+
+def create_indexes():
+    """Create the messages indexes on a table created before they existed"""
+    for index in Message.__table__.indexes:
+        print(f"Creating {index.name}...")
+        index.create(db.engine, checkfirst=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create the (sender_id, receiver_id, created_at, id) index conversation pages are read from')
+    parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        create_indexes()
+        print("Done")
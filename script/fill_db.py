@@ -20,8 +20,11 @@ from app import create_app
 from models.models import (
     db, User, UserProfile, UserPhoto, LunchPreference, CuisinePreference,
     DietaryRestriction, UserAvailability, Restaurant, LunchMeeting,
-    LunchMeetingParticipant, Notification, ConversationStarter, matches
+    LunchMeetingParticipant, Notification, ConversationStarter, Message, matches
 )
+from services.availability import rebuild_availability_bitmaps
+from services.seen import rebuild_seen
+from services.messaging import rebuild_conversation_threads
 
 # Data for generating random users
 first_names = [
@@ -79,8 +82,12 @@ def clear_database():
         db.session.execute(text("DELETE FROM conversation_starters"))
         db.session.execute(text("DELETE FROM lunch_meeting_participants"))
         db.session.execute(text("DELETE FROM lunch_meetings"))
+        db.session.execute(text("DELETE FROM conversation_threads"))
         db.session.execute(text("DELETE FROM messages"))
         db.session.execute(text("DELETE FROM matches"))
+        db.session.execute(text("DELETE FROM seen_containers"))
+        db.session.execute(text("DELETE FROM recommendations"))
+        db.session.execute(text("DELETE FROM availability_bitmaps"))
         db.session.execute(text("DELETE FROM user_availabilities"))
         db.session.execute(text("DELETE FROM dietary_restrictions"))
         db.session.execute(text("DELETE FROM cuisine_preferences"))
@@ -204,8 +211,10 @@ def generate_users(count=100):
                 print(f"Error committing batch of users: {e}")
                 sys.exit(1)
     
-    # Final commit for any remaining users
+    # Final commit for any remaining users, with every user's availability bitmap
     try:
+        db.session.flush()
+        rebuild_availability_bitmaps([user.id for user in users])
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -386,6 +395,12 @@ def create_matches(users, max_matches_per_user=5):
                     db.session.execute(stmt)
     
     try:
+        # Every user's seen bitmap, from the matches rows just created
+        rebuild_seen(user_ids)
+        
+        # Inbox summaries of the messages just created
+        db.session.flush()
+        rebuild_conversation_threads()
         db.session.commit()
         print("Successfully created matches")
     except Exception as e:
@@ -395,9 +410,6 @@ def create_matches(users, max_matches_per_user=5):
 
 def create_messages(user1_id, user2_id):
     """Create messages between two matched users"""
-    # Import Message model locally to avoid circular import
-    from controllers.messaging import Message
-    
     # Generate between 1 and 10 messages
     num_messages = random.randint(1, 10)
     
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, time
+from werkzeug.security import generate_password_hash
+from sqlalchemy import or_
+from dotenv import load_dotenv
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from app import create_app
+from models.models import (
+    db, User, UserProfile, UserPhoto, LunchPreference, CuisinePreference,
+    DietaryRestriction, UserAvailability, AvailabilityBitmap, Notification, Recommendation, SeenContainer,
+    matches, normalize_university
+)
+from services.availability import rebuild_availability_bitmaps
+from services.seen import rebuild_seen
+from services.vocabulary import refresh_cuisine_masks
+from script.fill_db import first_names, last_names, departments, cuisines, restrictions
+
+DEFAULT_UNIVERSITY = "Benchmark University"
+
+def _email(university, index):
+    slug = "".join(ch for ch in university.lower() if ch.isalnum())
+    return f"seed{index}@{slug}.example.edu"
+
+def seed_campus(university=DEFAULT_UNIVERSITY, count=10000, batch_size=1000):
+    """Bulk insert a campus of users with profiles, photos, preferences and availability"""
+    print(f"Seeding {count} users at {university}...")
+    password_hash = generate_password_hash("12345678")
+    now = datetime.now()
+
+    existing = db.session.query(db.func.count(UserProfile.id)).filter(UserProfile.university_key == normalize_university(university)).scalar()
+
+    for offset in range(existing, existing + count, batch_size):
+        indexes = range(offset, min(offset + batch_size, existing + count))
+        emails = [_email(university, i) for i in indexes]
+
+        db.session.execute(User.__table__.insert(), [
+            {'email': email, 'password_hash': password_hash, 'created_at': now} for email in emails
+        ])
+        user_ids = [row[0] for row in db.session.query(User.id).filter(User.email.in_(emails)).order_by(User.id)]
+
+        profiles, photos, preferences, availabilities = [], [], [], []
+        for user_id in user_ids:
+            first_name = random.choice(first_names)
+            profiles.append({
+                'user_id': user_id,
+                'first_name': first_name,
+                'last_name': random.choice(last_names),
+                'university': university,
+                'department': random.choice(departments),
+                'bio': f"Hi, I'm {first_name}.",
+                'graduation_year': random.randint(2025, 2029),
+                'created_at': now,
+                'updated_at': now
+            })
+            photos.append({
+                'user_id': user_id,
+                'photo_path': f"images/default-profile-{random.randint(1, 5)}.jpg",
+                'is_primary': True,
+                'upload_date': now
+            })
+            preferences.append({
+                'user_id': user_id,
+                'max_budget': random.choice([15.0, 20.0, 25.0, 30.0, None]),
+                'preferred_group_size': random.randint(2, 4),
+                'created_at': now,
+                'updated_at': now
+            })
+            for day in range(7):
+                if random.random() < 0.7:
+                    start_hour = random.randint(11, 13)
+                    end_hour = max(random.randint(13, 15), start_hour + 1)
+                    availabilities.append({
+                        'user_id': user_id,
+                        'day_of_week': day,
+                        'start_time': time(start_hour, 0),
+                        'end_time': time(end_hour, 0),
+                        'created_at': now
+                    })
+
+        db.session.execute(UserProfile.__table__.insert(), profiles)
+        db.session.execute(UserPhoto.__table__.insert(), photos)
+        db.session.execute(LunchPreference.__table__.insert(), preferences)
+        db.session.execute(UserAvailability.__table__.insert(), availabilities)
+        rebuild_availability_bitmaps(user_ids)
+
+        preference_ids = [row[0] for row in db.session.query(LunchPreference.id).
+                          filter(LunchPreference.user_id.in_(user_ids))]
+        cuisine_rows, restriction_rows = [], []
+        for preference_id in preference_ids:
+            for cuisine in random.sample([c.lower() for c in cuisines], random.randint(2, 5)):
+                cuisine_rows.append({'lunch_preference_id': preference_id, 'cuisine_type': cuisine, 'created_at': now})
+            if random.random() < 0.3:
+                for restriction in random.sample([r.lower() for r in restrictions], random.randint(1, 2)):
+                    restriction_rows.append({'lunch_preference_id': preference_id, 'restriction_type': restriction, 'created_at': now})
+
+        db.session.execute(CuisinePreference.__table__.insert(), cuisine_rows)
+        if restriction_rows:
+            db.session.execute(DietaryRestriction.__table__.insert(), restriction_rows)
+        refresh_cuisine_masks(preference_ids)
+
+        db.session.commit()
+        print(f"Seeded {indexes.stop - existing}/{count} users")
+
+    return campus_user_ids(university)
+
+def campus_user_ids(university=DEFAULT_UNIVERSITY):
+    """Ids of every user at a university, lowest first"""
+    return [row[0] for row in db.session.query(UserProfile.user_id).
+            filter(UserProfile.university_key == normalize_university(university)).order_by(UserProfile.user_id)]
+
+def remove_campus(university=DEFAULT_UNIVERSITY):
+    """Delete every user seeded at a university together with their data"""
+    user_ids = campus_user_ids(university)
+    print(f"Removing {len(user_ids)} users from {university}...")
+
+    # Users elsewhere who swiped on the campus get their seen bitmaps rebuilt without it
+    swiped_by = set()
+
+    for start in range(0, len(user_ids), 1000):
+        batch = user_ids[start:start + 1000]
+        swiped_by.update(row[0] for row in db.session.query(matches.c.user_id).
+                         filter(matches.c.matched_user_id.in_(batch)).distinct())
+        preference_ids = db.session.query(LunchPreference.id).filter(LunchPreference.user_id.in_(batch))
+        CuisinePreference.query.filter(CuisinePreference.lunch_preference_id.in_(preference_ids)).delete(synchronize_session=False)
+        DietaryRestriction.query.filter(DietaryRestriction.lunch_preference_id.in_(preference_ids)).delete(synchronize_session=False)
+        LunchPreference.query.filter(LunchPreference.user_id.in_(batch)).delete(synchronize_session=False)
+        UserAvailability.query.filter(UserAvailability.user_id.in_(batch)).delete(synchronize_session=False)
+        AvailabilityBitmap.query.filter(AvailabilityBitmap.user_id.in_(batch)).delete(synchronize_session=False)
+        Recommendation.query.filter(Recommendation.user_id.in_(batch)).delete(synchronize_session=False)
+        SeenContainer.query.filter(SeenContainer.user_id.in_(batch)).delete(synchronize_session=False)
+        UserPhoto.query.filter(UserPhoto.user_id.in_(batch)).delete(synchronize_session=False)
+        db.session.execute(matches.delete().where(or_(matches.c.user_id.in_(batch), matches.c.matched_user_id.in_(batch))))
+        Notification.query.filter(or_(Notification.user_id.in_(batch), Notification.related_user_id.in_(batch))).delete(synchronize_session=False)
+        UserProfile.query.filter(UserProfile.user_id.in_(batch)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(batch)).delete(synchronize_session=False)
+
+    rebuild_seen(sorted(swiped_by - set(user_ids)))
+    db.session.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Seed a campus of users for benchmarking')
+    parser.add_argument('--users', type=int, default=10000, help='Number of users to seed (default: 10000)')
+    parser.add_argument('--university', default=DEFAULT_UNIVERSITY, help=f'University name (default: {DEFAULT_UNIVERSITY})')
+    parser.add_argument('--remove', action='store_true', help='Remove the seeded campus instead of adding users')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        if args.remove:
+            remove_campus(args.university)
+        else:
+            seed_campus(args.university, args.users)
@@ -0,0 +1,107 @@
+import numpy as np
+from sqlalchemy import or_
+
+from models.models import db, AvailabilityBitmap, UserAvailability
+
+# A week is 7 days of 96 fifteen-minute slots. Each day is stored as two
+# 48-bit halves so both fit a signed BIGINT without touching the sign bit.
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+HALF_DAY_SLOTS = SLOTS_PER_DAY // 2
+DAYS_PER_WEEK = 7
+
+_HALF_DAY_MASK = (1 << HALF_DAY_SLOTS) - 1
+
+
+def day_mask(intervals):
+    """Build a 96-bit slot mask from (start_time, end_time) pairs on one day.
+
+    Slots are marked from the one holding the start time through the one
+    holding the end time. Both ends are inclusive, like the overlap test used
+    elsewhere in the app, so availability ending at 12:00 shares a slot with
+    availability starting at 12:00.
+    """
+    mask = 0
+    for start_time, end_time in intervals:
+        first = (start_time.hour * 60 + start_time.minute) // SLOT_MINUTES
+        last = (end_time.hour * 60 + end_time.minute) // SLOT_MINUTES
+        if first <= last:
+            mask |= ((1 << (last - first + 1)) - 1) << first
+    return mask
+
+
+def split_day_mask(mask):
+    """Split a day mask into its (am_slots, pm_slots) columns"""
+    return mask & _HALF_DAY_MASK, mask >> HALF_DAY_SLOTS
+
+
+def week_masks(availabilities):
+    """Day masks keyed by day_of_week from (day_of_week, start_time, end_time) tuples"""
+    intervals = {}
+    for day_of_week, start_time, end_time in availabilities:
+        if 0 <= day_of_week < DAYS_PER_WEEK:
+            intervals.setdefault(day_of_week, []).append((start_time, end_time))
+    masks = {day_of_week: day_mask(day_intervals) for day_of_week, day_intervals in intervals.items()}
+    return {day_of_week: mask for day_of_week, mask in masks.items() if mask}
+
+
+def week_slots(availabilities):
+    """Weekly slots as an int64 array of (am, pm) halves per day, as used by CandidatePool"""
+    slots = np.zeros(DAYS_PER_WEEK * 2, dtype=np.int64)
+    for day_of_week, mask in week_masks(availabilities).items():
+        slots[day_of_week * 2], slots[day_of_week * 2 + 1] = split_day_mask(mask)
+    return slots
+
+
+def week_slots_from_bitmaps(rows):
+    """Weekly slots from stored (day_of_week, am_slots, pm_slots) rows"""
+    slots = np.zeros(DAYS_PER_WEEK * 2, dtype=np.int64)
+    for day_of_week, am_slots, pm_slots in rows:
+        if 0 <= day_of_week < DAYS_PER_WEEK:
+            slots[day_of_week * 2] = am_slots
+            slots[day_of_week * 2 + 1] = pm_slots
+    return slots
+
+
+def slots_overlap(first, second):
+    """SQL condition for two AvailabilityBitmap rows (or aliases) sharing a slot.
+
+    Join them on day_of_week first; the condition only compares the slots.
+    """
+    return or_(first.am_slots.op('&')(second.am_slots) != 0,
+               first.pm_slots.op('&')(second.pm_slots) != 0)
+
+
+def rebuild_availability_bitmaps(user_ids, batch_size=500):
+    """Recompute the stored bitmaps of some users from their UserAvailability rows.
+
+    Runs in the current transaction without committing, so pending
+    availability changes must already be flushed.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+
+        availabilities = {user_id: [] for user_id in batch}
+        for user_id, day_of_week, start_time, end_time in db.session.query(
+                UserAvailability.user_id, UserAvailability.day_of_week,
+                UserAvailability.start_time, UserAvailability.end_time).\
+                filter(UserAvailability.user_id.in_(batch)):
+            availabilities[user_id].append((day_of_week, start_time, end_time))
+
+        rows = []
+        for user_id, user_availabilities in availabilities.items():
+            for day_of_week, mask in week_masks(user_availabilities).items():
+                am_slots, pm_slots = split_day_mask(mask)
+                rows.append({'user_id': user_id, 'day_of_week': day_of_week,
+                             'am_slots': am_slots, 'pm_slots': pm_slots})
+
+        db.session.execute(AvailabilityBitmap.__table__.delete().where(AvailabilityBitmap.user_id.in_(batch)))
+        if rows:
+            db.session.execute(AvailabilityBitmap.__table__.insert(), rows)
+
+
+def sync_availability_bitmap(user):
+    """Bring a user's stored bitmap in line with their availability before the caller commits"""
+    db.session.flush()
+    rebuild_availability_bitmaps([user.id])
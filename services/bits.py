@@ -0,0 +1,22 @@
+import numpy as np
+
+# Number of set bits for every possible byte value
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def byte_popcounts(array):
+    """Number of set bits in every byte of a NumPy array, as a uint8 array of its bytes"""
+    return _BYTE_POPCOUNT[array.view(np.uint8)]
+
+
+def sql_popcount(expression, bits):
+    """SQL expression counting the set bits of a BIGINT mask expression.
+
+    Written with shifts and ANDs only, so it runs the same on PostgreSQL and
+    SQLite. Only the lowest bits bits are counted, which keeps the expression
+    short.
+    """
+    total = expression.op('&')(1)
+    for bit in range(1, bits):
+        total = total + expression.op('>>')(bit).op('&')(1)
+    return total
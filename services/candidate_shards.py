@@ -0,0 +1,158 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+
+from models.models import db, UserProfile, normalize_university
+from services.candidates import load_features, load_university_features
+from services.scoring import CandidatePool
+from services.seen import container_keys, load_seen
+
+
+class CandidateShard:
+    """Scoring features of every user at one university, ordered by user id.
+
+    A shard is never changed once built: refreshing users makes a patched
+    copy, so requests scoring against the previous one are unaffected.
+    """
+
+    def __init__(self, university_key, pool, loaded_at=None):
+        self.university_key = university_key
+        self.pool = pool
+        self.loaded_at = loaded_at or time.time()
+        self.positions = {user_id: row for row, user_id in enumerate(pool.user_ids.tolist())}
+        self.container_keys = container_keys(pool.user_ids)
+
+    @classmethod
+    def load(cls, university_key):
+        return cls(university_key, CandidatePool(load_university_features(university_key)))
+
+    def __len__(self):
+        return len(self.pool)
+
+    def is_expired(self, ttl):
+        return time.time() - self.loaded_at >= ttl
+
+    def refreshed(self, user_ids):
+        """A copy with the features of some users reloaded, or None when users joined or left the university"""
+        keys = dict(db.session.query(UserProfile.user_id, UserProfile.university_key).
+                    filter(UserProfile.user_id.in_(user_ids)))
+        for user_id in user_ids:
+            if (keys.get(user_id) == self.university_key) != (user_id in self.positions):
+                return None
+
+        pool = self.pool.take(np.arange(len(self.pool)))
+        for candidate in load_features([user_id for user_id in user_ids if user_id in self.positions]):
+            pool.set(self.positions[candidate[0]], candidate)
+        return CandidateShard(self.university_key, pool, self.loaded_at)
+
+    def candidates(self, user_id, seen=None):
+        """Pool of the user's discover candidates: everyone else here they have not interacted with or been served"""
+        eligible = self.pool.user_ids != user_id
+
+        # Only the seen bitmap containers covering this university are read
+        eligible &= ~load_seen(user_id, self.container_keys).contains(self.pool.user_ids)
+        if seen is not None and len(seen):
+            eligible &= ~seen.contains(self.pool.user_ids)
+
+        return self.pool.take(eligible)
+
+
+class CandidateShards:
+    """Process-local candidate shards, one per university key.
+
+    Shards load on first use and reload once older than ttl; while one
+    request reloads a shard, others keep scoring against the previous copy.
+    Users edited in this process are patched in on the next read. Least
+    recently used shards are evicted once more than max_users users are held,
+    except pinned shards warmed at startup, which only ever reload.
+    """
+
+    def __init__(self, ttl=300, max_users=200000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._shards = OrderedDict()
+        self._pinned = set()
+        self._dirty = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def shard(self, university, pin=False):
+        key = normalize_university(university)
+        with self._lock:
+            shard = self._shards.get(key)
+            if pin:
+                self._pinned.add(key)
+            if shard is not None and not self._dirty.get(key) and not shard.is_expired(self.ttl):
+                self._shards.move_to_end(key)
+                return shard
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        # Serve the previous shard while another request refreshes it
+        if not loading.acquire(blocking=shard is None):
+            return shard
+        try:
+            with self._lock:
+                shard = self._shards.get(key)
+                dirty = self._dirty.pop(key, set())
+
+            if shard is not None and not shard.is_expired(self.ttl) and dirty:
+                shard = shard.refreshed(sorted(dirty))
+            if shard is None or shard.is_expired(self.ttl):
+                shard = CandidateShard.load(key)
+
+            with self._lock:
+                self._shards[key] = shard
+                self._shards.move_to_end(key)
+                self._evict()
+        finally:
+            loading.release()
+        return shard
+
+    def invalidate_user(self, user_id, *universities):
+        """Reload a user's features in the shards of the given universities on their next read.
+
+        Call after committing a change to the user's preferences, availability
+        or university, passing both the old and new university on a move.
+        """
+        with self._lock:
+            for university in universities:
+                key = normalize_university(university)
+                if key in self._loading:
+                    self._dirty.setdefault(key, set()).add(user_id)
+
+    def _evict(self):
+        held = sum(len(shard) for shard in self._shards.values())
+        for key in list(self._shards.keys())[:-1]:
+            if held <= self.max_users:
+                break
+            if key not in self._pinned:
+                held -= len(self._shards.pop(key))
+                self._dirty.pop(key, None)
+
+
+def init_candidate_shards(app):
+    """Create the candidate shards and register them on the app"""
+    shards = CandidateShards(app.config['CANDIDATE_SHARD_TTL'], app.config['CANDIDATE_SHARD_MAX_USERS'])
+    app.extensions['candidate_shards'] = shards
+    return shards
+
+
+def candidate_shards():
+    return current_app.extensions['candidate_shards']
+
+
+def warm_candidate_shards(min_users):
+    """Load and pin the shard of every university with at least min_users users"""
+    shards = candidate_shards()
+    universities = db.session.query(UserProfile.university_key).\
+        group_by(UserProfile.university_key).\
+        having(db.func.count(UserProfile.id) >= min_users)
+    for (university_key,) in universities:
+        shards.shard(university_key, pin=True)
+
+
+def candidate_pool(user_id, university, seen=None):
+    """Discover candidates of a user at a university, taken from the university's shard"""
+    return candidate_shards().shard(university).candidates(user_id, seen)
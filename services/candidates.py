@@ -0,0 +1,149 @@
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models.models import db, User, UserProfile, UserPhoto, LunchPreference, CuisinePreference, DietaryRestriction, UserAvailability, matches
+from models.models import AvailabilityBitmap, normalize_university
+from services.availability import week_slots_from_bitmaps
+
+# Maximum number of ids bound into a single IN (...) clause
+BATCH_SIZE = 500
+
+
+def _chunks(ids, size=BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def not_interacted(user_id, candidate_id=User.id):
+    """Anti-join excluding candidates the viewer already liked, matched or blocked"""
+    return ~db.session.query(matches.c.matched_user_id).filter(
+        matches.c.user_id == user_id,
+        matches.c.matched_user_id == candidate_id
+    ).exists()
+
+
+def load_discover_candidates(user_id, university):
+    """Load every discover candidate at a university with all card collections attached"""
+    rows = db.session.query(User, UserProfile).\
+        join(UserProfile, User.id == UserProfile.user_id).\
+        filter(
+            User.id != user_id,
+            UserProfile.university_key == normalize_university(university),
+            not_interacted(user_id)
+        ).\
+        order_by(User.id).\
+        all()
+
+    return attach_collections(rows)
+
+
+def load_university_features(university):
+    """Scoring features of every user at a university, ordered by user id"""
+    user_ids = [row[0] for row in db.session.query(UserProfile.user_id).
+                filter(UserProfile.university_key == normalize_university(university)).
+                order_by(UserProfile.user_id)]
+    return load_features(user_ids)
+
+
+def load_features(user_ids):
+    """(user_id, cuisine_mask, slots, max_budget) tuples for the given users, in the given order"""
+    bitmaps = {user_id: [] for user_id in user_ids}
+    preferences = {}
+
+    for batch in _chunks(user_ids):
+        for preference_user_id, cuisine_mask, max_budget in db.session.query(
+                LunchPreference.user_id, LunchPreference.cuisine_mask, LunchPreference.max_budget).\
+                filter(LunchPreference.user_id.in_(batch)):
+            preferences[preference_user_id] = (cuisine_mask, max_budget)
+
+        for bitmap_user_id, day_of_week, am_slots, pm_slots in db.session.query(
+                AvailabilityBitmap.user_id, AvailabilityBitmap.day_of_week,
+                AvailabilityBitmap.am_slots, AvailabilityBitmap.pm_slots).\
+                filter(AvailabilityBitmap.user_id.in_(batch)):
+            bitmaps[bitmap_user_id].append((day_of_week, am_slots, pm_slots))
+
+    features = []
+    for user_id, user_bitmaps in bitmaps.items():
+        cuisine_mask, max_budget = preferences.get(user_id, (0, None))
+        features.append((user_id, cuisine_mask, week_slots_from_bitmaps(user_bitmaps), max_budget))
+    return features
+
+
+def candidate_stamp(data):
+    """(UserProfile.version, LunchPreference.version) of a candidate loaded by attach_collections"""
+    return (data['profile'].version, data['preference'].version if data['preference'] else None)
+
+
+def load_users_with_collections(user_ids):
+    """Load specific users, in the given order, with all card collections attached"""
+    if not user_ids:
+        return []
+
+    rows = db.session.query(User, UserProfile).\
+        join(UserProfile, User.id == UserProfile.user_id).\
+        filter(User.id.in_(user_ids)).\
+        all()
+
+    position = {user_id: index for index, user_id in enumerate(user_ids)}
+    rows.sort(key=lambda row: position[row[0].id])
+    return attach_collections(rows)
+
+
+def attach_collections(rows):
+    """Attach photos, preferences and availability to (User, UserProfile) rows.
+
+    Each collection is fetched once per batch of users, so the number of rows
+    read grows with the data itself rather than with the product of every
+    collection. The loaded collections are also set on the ORM relationships,
+    so templates reading them do not trigger lazy loads.
+    """
+    candidates = {}
+    for user, profile in rows:
+        candidates[user.id] = {
+            'user': user,
+            'profile': profile,
+            'photos': [],
+            'preference': None,
+            'cuisines': [],
+            'restrictions': [],
+            'availabilities': []
+        }
+
+    user_ids = list(candidates.keys())
+    preferences_by_id = {}
+
+    for batch in _chunks(user_ids):
+        for photo in UserPhoto.query.filter(UserPhoto.user_id.in_(batch)).order_by(UserPhoto.id):
+            candidates[photo.user_id]['photos'].append(photo)
+
+        for availability in UserAvailability.query.filter(UserAvailability.user_id.in_(batch)).\
+                order_by(UserAvailability.id):
+            candidates[availability.user_id]['availabilities'].append(availability)
+
+        batch_preferences = LunchPreference.query.filter(LunchPreference.user_id.in_(batch)).all()
+        for preference in batch_preferences:
+            candidates[preference.user_id]['preference'] = preference
+            preferences_by_id[preference.id] = preference
+
+        preference_ids = [preference.id for preference in batch_preferences]
+        if preference_ids:
+            for cuisine in CuisinePreference.query.filter(CuisinePreference.lunch_preference_id.in_(preference_ids)).\
+                    order_by(CuisinePreference.id):
+                user_id = preferences_by_id[cuisine.lunch_preference_id].user_id
+                candidates[user_id]['cuisines'].append(cuisine)
+
+            for restriction in DietaryRestriction.query.filter(DietaryRestriction.lunch_preference_id.in_(preference_ids)).\
+                    order_by(DietaryRestriction.id):
+                user_id = preferences_by_id[restriction.lunch_preference_id].user_id
+                candidates[user_id]['restrictions'].append(restriction)
+
+    for data in candidates.values():
+        user = data['user']
+        set_committed_value(user, 'profile', data['profile'])
+        set_committed_value(user, 'photos', data['photos'])
+        set_committed_value(user, 'availability', data['availabilities'])
+        set_committed_value(user, 'lunch_preferences', data['preference'])
+        if data['preference'] is not None:
+            set_committed_value(data['preference'], 'cuisine_preferences', data['cuisines'])
+            set_committed_value(data['preference'], 'dietary_restrictions', data['restrictions'])
+
+    return list(candidates.values())
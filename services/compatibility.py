@@ -0,0 +1,144 @@
+from collections import namedtuple
+from flask import g
+
+from models.models import db, LunchPreference, UserAvailability
+from services.availability import week_slots
+from services.candidates import candidate_stamp
+from services.pair_scores import load_stamps, score_pairs, user_stamp
+from services.restaurants import budget_price_cap
+from services.vocabulary import CUISINES
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class UserFeatures(namedtuple('UserFeatures', ['user_id', 'stamp', 'cuisine_mask', 'max_budget', 'availability', 'slots'])):
+    """Everything compatibility is computed from for one user.
+
+    availability holds (day_of_week, start_time, end_time) tuples and slots
+    the same intervals as built by services.availability.week_slots. The stamp
+    is the (UserProfile.version, LunchPreference.version) pair the features
+    were read under, as used by the pair score cache.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, user_id, stamp, preference, availability):
+        """Build from a preference with cuisine_mask and max_budget (or None) and availability rows"""
+        availability = tuple((a.day_of_week, a.start_time, a.end_time) for a in availability)
+        return cls(user_id, stamp,
+                   preference.cuisine_mask if preference else 0,
+                   preference.max_budget if preference else None,
+                   availability,
+                   week_slots(availability))
+
+    @property
+    def scoring(self):
+        """(cuisine_mask, slots, max_budget) as scored against a CandidatePool"""
+        return self.cuisine_mask, self.slots, self.max_budget
+
+    @property
+    def candidate(self):
+        """(user_id, cuisine_mask, slots, max_budget) as held by a CandidatePool"""
+        return self.user_id, self.cuisine_mask, self.slots, self.max_budget
+
+
+def _memoized(user_id, build):
+    """Features of a user built at most once per request, kept on flask.g"""
+    features = g.setdefault('user_features', {})
+    if user_id not in features:
+        features[user_id] = build()
+    return features[user_id]
+
+
+def user_features(user):
+    """Features of a loaded User, read from its preference and availability relationships"""
+    return _memoized(user.id, lambda: UserFeatures.build(
+        user.id, user_stamp(user), user.lunch_preferences, sorted(user.availability, key=lambda a: a.id)))
+
+
+def card_features(card):
+    """Features of a cached UserCard"""
+    return _memoized(card.user.id, lambda: UserFeatures.build(
+        card.user.id, card.stamp, card.preferences, card.user.availability))
+
+
+def candidate_user_features(data):
+    """Features of a candidate loaded by attach_collections"""
+    return _memoized(data['user'].id, lambda: UserFeatures.build(
+        data['user'].id, candidate_stamp(data), data['preference'], data['availabilities']))
+
+
+def load_user_features(user_ids):
+    """Features of users by id, keyed by user id, reading only those not built yet in this request"""
+    features = g.setdefault('user_features', {})
+    missing = [user_id for user_id in user_ids if user_id not in features]
+
+    if missing:
+        stamps = load_stamps(missing)
+        preferences = {preference.user_id: preference for preference in db.session.query(
+            LunchPreference.user_id, LunchPreference.cuisine_mask, LunchPreference.max_budget).
+            filter(LunchPreference.user_id.in_(missing))}
+        availability = {user_id: [] for user_id in missing}
+        for row in db.session.query(UserAvailability.user_id, UserAvailability.day_of_week,
+                                    UserAvailability.start_time, UserAvailability.end_time).\
+                filter(UserAvailability.user_id.in_(missing)).\
+                order_by(UserAvailability.id):
+            availability[row.user_id].append(row)
+
+        for user_id in missing:
+            features[user_id] = UserFeatures.build(user_id, stamps.get(user_id), preferences.get(user_id),
+                                                   availability[user_id])
+
+    return {user_id: features[user_id] for user_id in user_ids}
+
+
+def score_against(user, others, features):
+    """Score others, a list of (user_id, stamp), against a loaded User, reusing cached pair scores.
+
+    features(position) returns the UserFeatures of others[position]. Both
+    sides' features are only built for pairs not cached. Returns PoolScores
+    in the order of others.
+    """
+    return score_pairs(user.id, user_stamp(user), lambda: user_features(user).scoring, others,
+                       lambda position: features(position).candidate)
+
+
+def overlapping_availability(first, second):
+    """Overlapping availability of two users as formatted times keyed by day name"""
+    common_times = {}
+    for day_of_week, day in enumerate(DAY_NAMES):
+        first_times = [(start, end) for d, start, end in first.availability if d == day_of_week]
+        second_times = [(start, end) for d, start, end in second.availability if d == day_of_week]
+        if not first_times or not second_times:
+            continue
+
+        common_times[day] = []
+        for first_start, first_end in first_times:
+            for second_start, second_end in second_times:
+                latest_start = max(first_start, second_start)
+                earliest_end = min(first_end, second_end)
+                if latest_start < earliest_end:
+                    common_times[day].append({
+                        'start': latest_start.strftime('%I:%M %p'),
+                        'end': earliest_end.strftime('%I:%M %p')
+                    })
+
+    return common_times
+
+
+def restaurant_request(first, second, fallback=False):
+    """(cuisine_list, price_cap) to recommend restaurants for two users.
+
+    Cuisines are those both users like; with fallback, users with none in
+    common get every cuisine either of them likes. The price cap follows the
+    lower of the two budgets, or is None when neither has a budget.
+    """
+    cuisine_mask = first.cuisine_mask & second.cuisine_mask
+    if fallback:
+        cuisine_mask = cuisine_mask or (first.cuisine_mask | second.cuisine_mask)
+
+    cuisine_list = CUISINES.names(cuisine_mask)
+    if not cuisine_list:
+        return [], None
+
+    return cuisine_list, budget_price_cap(min(first.max_budget or float('inf'), second.max_budget or float('inf')))
@@ -0,0 +1,31 @@
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models.models import db
+
+
+def dialect_name(session=None):
+    """Name of the database dialect the session talks to"""
+    return (session or db.session).get_bind().dialect.name
+
+
+def insert_ignore(table, session=None):
+    """INSERT construct for the current dialect that skips rows whose key already exists.
+
+    PostgreSQL and SQLite use ON CONFLICT DO NOTHING. MySQL uses ON DUPLICATE
+    KEY UPDATE with a no-op assignment rather than INSERT IGNORE, which would
+    also turn unrelated errors into warnings.
+    """
+    dialect = dialect_name(session)
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == 'mysql':
+        key = next(iter(table.primary_key.columns))
+        return mysql.insert(table).on_duplicate_key_update({key.name: key})
+    raise NotImplementedError(f"INSERT that skips existing keys is not available for {dialect}")
+
+
+def supports_update_returning(session=None):
+    """Whether UPDATE ... RETURNING can be used, which MySQL lacks"""
+    return (session or db.session).get_bind().dialect.update_returning
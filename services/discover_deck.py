@@ -0,0 +1,222 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+
+
+def deck_seed(user_id, period, now=None):
+    """Shuffle seed of a user's deck, the same for every rebuild within one period"""
+    window = int((now if now is not None else time.time()) // period)
+    return (window << 32) | user_id
+
+
+def _shuffle_keys(user_ids, seed):
+    """Pseudo-random 32-bit key of each user id, fixed for a seed whatever other ids are ranked"""
+    with np.errstate(over='ignore'):
+        z = np.asarray(user_ids, dtype=np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(32)).astype(np.int64)
+
+
+def _deck_key(scores, user_ids, seed, band):
+    """Combine the score band and shuffle key into one int64 that increases along the deck order"""
+    bands = np.asarray(scores, dtype=np.int64) // band
+    return -bands * (1 << 32) + _shuffle_keys(user_ids, seed)
+
+
+class SeenSet:
+    """Compact set of user ids, kept as a sorted array of unique int32 values"""
+
+    def __init__(self, ids=None):
+        self.ids = np.unique(np.asarray(ids if ids is not None else [], dtype=np.int32))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids):
+        if len(ids):
+            self.ids = np.union1d(self.ids, np.asarray(ids, dtype=np.int32)).astype(np.int32)
+
+    def contains(self, ids):
+        """Boolean mask telling which of the given ids are in the set"""
+        ids = np.asarray(ids, dtype=np.int32)
+        if not len(self.ids):
+            return np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return self.ids[positions] == ids
+
+
+class DiscoverDeck:
+    """A snapshot of a user's ranked discover candidates, read front to back.
+
+    Candidates are grouped into bands of scores (highest first) and shuffled
+    within a band by a seeded hash of their id, so near-equal candidates take
+    turns at the top instead of the same ones always winning ties. The seed
+    only changes once per shuffle period, so a deck rebuilt within the period
+    keeps its order. The position is the index of the next entry to serve.
+    The deck also keeps a seen-set of the users it has served, so a rebuilt
+    deck can leave them out. A deck that is not complete only holds the best
+    candidates, and more may exist once it runs out.
+    """
+
+    def __init__(self, user_ids, scores, built_at=None, position=0, seen=None, complete=True, seed=0):
+        # user_ids and scores must already be in deck order, see from_scores()
+        self.user_ids = np.asarray(user_ids, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.int32)
+        self.built_at = built_at if built_at is not None else time.time()
+        self.position = position
+        self.seen = seen if seen is not None else SeenSet()
+        self.complete = complete
+        self.seed = seed
+
+    @classmethod
+    def from_scores(cls, user_ids, scores, seen=None, limit=None, seed=0, band=1):
+        """Rank scored candidates into a new deck, keeping only the best limit when given"""
+        user_ids = np.asarray(user_ids, dtype=np.int32)
+        scores = np.asarray(scores, dtype=np.int32)
+        keys = _deck_key(scores, user_ids, seed, band)
+
+        complete = limit is None or limit >= len(user_ids)
+        if not complete:
+            best = np.argpartition(keys, limit)[:limit]
+            user_ids, scores, keys = user_ids[best], scores[best], keys[best]
+
+        order = np.lexsort((user_ids, keys))
+        return cls(user_ids[order], scores[order], seen=seen, complete=complete, seed=seed)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def is_expired(self, ttl):
+        return time.time() - self.built_at >= ttl
+
+    def page(self, position, size):
+        """Return up to size (user_id, score) entries starting at position"""
+        stop = position + size
+        return [(int(user_id), int(score))
+                for user_id, score in zip(self.user_ids[position:stop], self.scores[position:stop])]
+
+    def mark_seen(self, user_ids):
+        self.seen.add(user_ids)
+
+
+class MemoryDeckStore:
+    """Keeps decks in this process, evicting expired and least recently used entries"""
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, deck = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return deck
+
+    def put(self, key, deck):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, deck)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteDeckStore:
+    """Keeps decks in a local SQLite file so every worker process on a node shares them"""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS discover_decks ('
+                'key TEXT PRIMARY KEY, user_ids BLOB NOT NULL, scores BLOB NOT NULL, '
+                'processed_ids BLOB NOT NULL, built_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_discover_decks_expires_at ON discover_decks (expires_at)')
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(discover_decks)')]
+            if 'complete' not in columns:
+                connection.execute('ALTER TABLE discover_decks ADD COLUMN complete INTEGER NOT NULL DEFAULT 1')
+            if 'position' not in columns:
+                connection.execute('ALTER TABLE discover_decks ADD COLUMN position INTEGER NOT NULL DEFAULT 0')
+            if 'seed' not in columns:
+                connection.execute('ALTER TABLE discover_decks ADD COLUMN seed INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT user_ids, scores, processed_ids, position, built_at, complete, seed '
+            'FROM discover_decks WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+
+        user_ids, scores, seen_ids, position, built_at, complete, seed = row
+        return DiscoverDeck(
+            np.frombuffer(user_ids, dtype=np.int32),
+            np.frombuffer(scores, dtype=np.int32),
+            built_at=built_at,
+            position=position,
+            seen=SeenSet(np.frombuffer(seen_ids, dtype=np.int32)),
+            complete=bool(complete),
+            seed=seed
+        )
+
+    def put(self, key, deck):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute('DELETE FROM discover_decks WHERE expires_at <= ?', (now,))
+            connection.execute(
+                'INSERT OR REPLACE INTO discover_decks '
+                '(key, user_ids, scores, processed_ids, position, built_at, expires_at, complete, seed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, deck.user_ids.tobytes(), deck.scores.tobytes(), deck.seen.ids.tobytes(),
+                 deck.position, deck.built_at, now + self.ttl, int(deck.complete), deck.seed)
+            )
+
+    def delete(self, key):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM discover_decks WHERE key = ?', (key,))
+
+
+def init_deck_store(app):
+    """Create the configured deck store and register it on the app"""
+    ttl = app.config['DISCOVER_STORE_TTL']
+
+    if app.config['DISCOVER_DECK_STORE'] == 'sqlite':
+        path = os.path.join(app.root_path, app.config['DISCOVER_DECK_STORE_PATH'])
+        store = SQLiteDeckStore(path, ttl)
+    else:
+        store = MemoryDeckStore(ttl, app.config['DISCOVER_DECK_STORE_MAX_ENTRIES'])
+
+    app.extensions['discover_deck_store'] = store
+    return store
+
+
+def deck_store():
+    return current_app.extensions['discover_deck_store']
@@ -0,0 +1,143 @@
+from sqlalchemy import and_, or_, desc, func, case, select, union_all
+
+from models.models import db, Message, ConversationThread
+from services.database import insert_ignore
+
+
+def thread_pair(user_id, other_user_id):
+    """(user1_id, user2_id) of the thread between two users"""
+    return min(user_id, other_user_id), max(user_id, other_user_id)
+
+
+def unread_column(user_id, other_user_id):
+    """Unread counter column of user_id in their thread with other_user_id"""
+    table = ConversationThread.__table__
+    return table.c.user1_unread if user_id < other_user_id else table.c.user2_unread
+
+
+def record_message(message):
+    """Make a flushed message the last one of its thread and count it as unread, in the current transaction"""
+    table = ConversationThread.__table__
+    user1_id, user2_id = thread_pair(message.sender_id, message.receiver_id)
+
+    # Create the thread on the pair's first message, keeping one another request created
+    db.session.execute(insert_ignore(table).values(
+        user1_id=user1_id, user2_id=user2_id, user1_unread=0, user2_unread=0
+    ))
+
+    # Concurrent sends update the row one at a time; only a newer message replaces the last one
+    newer = or_(
+        table.c.last_message_at.is_(None),
+        table.c.last_message_at < message.created_at,
+        and_(table.c.last_message_at == message.created_at, table.c.last_message_id < message.id)
+    )
+    unread = unread_column(message.receiver_id, message.sender_id)
+    db.session.execute(table.update().where(
+        table.c.user1_id == user1_id, table.c.user2_id == user2_id
+    ).values({
+        table.c.last_message_id: case((newer, message.id), else_=table.c.last_message_id),
+        table.c.last_message_at: case((newer, message.created_at), else_=table.c.last_message_at),
+        unread: unread + 1
+    }))
+
+
+def mark_read(reader_id, sender_id, message_ids=None):
+    """Mark messages from sender_id to reader_id as read, all or only the given ids, in the current transaction"""
+    if message_ids is not None and not message_ids:
+        return 0
+
+    query = Message.query.filter(
+        Message.sender_id == sender_id,
+        Message.receiver_id == reader_id,
+        Message.is_read == False
+    )
+    if message_ids is not None:
+        query = query.filter(Message.id.in_(message_ids))
+
+    # Only rows this statement flipped are taken off the counter, so concurrent reads never count twice
+    read = query.update({Message.is_read: True}, synchronize_session=False)
+    if read:
+        table = ConversationThread.__table__
+        user1_id, user2_id = thread_pair(reader_id, sender_id)
+        unread = unread_column(reader_id, sender_id)
+        db.session.execute(table.update().where(
+            table.c.user1_id == user1_id, table.c.user2_id == user2_id
+        ).values({unread: case((unread > read, unread - read), else_=0)}))
+    return read
+
+
+def between(user_id, other_user_id):
+    """Filter for the messages exchanged between two users, in either direction"""
+    return or_(
+        and_(Message.sender_id == user_id, Message.receiver_id == other_user_id),
+        and_(Message.sender_id == other_user_id, Message.receiver_id == user_id)
+    )
+
+
+def message_page(user_id, other_user_id, limit, before_id=None):
+    """Newest messages between two users, or those older than before_id, as (messages oldest first, has_older).
+
+    Pages follow the (created_at, id) keyset. Each direction is read newest
+    first from the sender/receiver index and stops after limit + 1 rows, so
+    a page costs the same however long the conversation is.
+    """
+    older = None
+    if before_id is not None:
+        before_at = db.session.query(Message.created_at).\
+            filter(Message.id == before_id, between(user_id, other_user_id)).\
+            scalar()
+        if before_at is None:
+            return [], False
+        older = or_(Message.created_at < before_at, and_(Message.created_at == before_at, Message.id < before_id))
+
+    def newest(sender_id, receiver_id):
+        query = select(Message.id).where(Message.sender_id == sender_id, Message.receiver_id == receiver_id)
+        if older is not None:
+            query = query.where(older)
+        return select(query.order_by(desc(Message.created_at), desc(Message.id)).limit(limit + 1).subquery().c.id)
+
+    messages = Message.query.\
+        filter(Message.id.in_(union_all(newest(user_id, other_user_id), newest(other_user_id, user_id)))).\
+        order_by(desc(Message.created_at), desc(Message.id)).\
+        limit(limit + 1).\
+        all()
+
+    return messages[:limit][::-1], len(messages) > limit
+
+
+def rebuild_conversation_threads():
+    """Recompute every conversation thread from the messages table, without committing"""
+    table = ConversationThread.__table__
+    user1_id = case((Message.sender_id < Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+    user2_id = case((Message.sender_id < Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+
+    ranked = select(
+        user1_id.label('user1_id'),
+        user2_id.label('user2_id'),
+        Message.id,
+        Message.created_at,
+        Message.receiver_id,
+        Message.is_read,
+        func.row_number().over(
+            partition_by=(user1_id, user2_id),
+            order_by=(Message.created_at.desc(), Message.id.desc())
+        ).label('recency')
+    ).subquery('ranked')
+
+    def unread(receiver_id):
+        return func.sum(case((and_(ranked.c.receiver_id == receiver_id, ranked.c.is_read == False), 1), else_=0))
+
+    summary = select(
+        ranked.c.user1_id,
+        ranked.c.user2_id,
+        func.max(case((ranked.c.recency == 1, ranked.c.id))),
+        func.max(ranked.c.created_at),
+        unread(ranked.c.user1_id),
+        unread(ranked.c.user2_id)
+    ).group_by(ranked.c.user1_id, ranked.c.user2_id)
+
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['user1_id', 'user2_id', 'last_message_id', 'last_message_at', 'user1_unread', 'user2_unread'],
+        summary
+    ))
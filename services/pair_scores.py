@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+
+from models.models import db, UserProfile, LunchPreference
+from services.scoring import CandidatePool, PoolScores
+
+
+def user_stamp(user):
+    """(UserProfile.version, LunchPreference.version) of a loaded user.
+
+    Availability edits bump the profile version and preference edits the
+    preference version, so the pair changes whenever either side's inputs do.
+    """
+    return (user.profile.version if user.profile else None,
+            user.lunch_preferences.version if user.lunch_preferences else None)
+
+
+def load_stamps(user_ids):
+    """Stamps of several users read with one query, keyed by user id"""
+    return {user_id: (profile_version, preference_version)
+            for user_id, profile_version, preference_version in db.session.query(
+                UserProfile.user_id, UserProfile.version, LunchPreference.version).
+            outerjoin(LunchPreference, LunchPreference.user_id == UserProfile.user_id).
+            filter(UserProfile.user_id.in_(user_ids))}
+
+
+class PairScoreCache:
+    """Process-local LRU of per-pair results, versioned by both users' stamps.
+
+    Entries are grouped by viewer. A viewer's whole group is dropped when their
+    own stamp changes or when they are invalidated, and a single entry when the
+    other user's stamp no longer matches. Least recently used viewers are
+    evicted first. The kind names what was computed for the pair, so pages
+    that need different results can share the cache.
+    """
+
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self._viewers = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, kind, viewer_id, viewer_stamp, other_id, other_stamp):
+        with self._lock:
+            group = self._viewers.get(viewer_id)
+            if group is None:
+                return None
+            if group[0] != viewer_stamp:
+                self._drop(viewer_id)
+                return None
+            self._viewers.move_to_end(viewer_id)
+
+            entry = group[1].get((kind, other_id))
+            if entry is None:
+                return None
+            if entry[0] != other_stamp:
+                del group[1][(kind, other_id)]
+                self._size -= 1
+                return None
+            return entry[1]
+
+    def put(self, kind, viewer_id, viewer_stamp, other_id, other_stamp, value):
+        with self._lock:
+            group = self._viewers.get(viewer_id)
+            if group is None or group[0] != viewer_stamp:
+                if group is not None:
+                    self._drop(viewer_id)
+                group = (viewer_stamp, {})
+                self._viewers[viewer_id] = group
+            self._viewers.move_to_end(viewer_id)
+
+            if (kind, other_id) not in group[1]:
+                self._size += 1
+            group[1][(kind, other_id)] = (other_stamp, value)
+
+            while self._size > self.max_entries and len(self._viewers) > 1:
+                oldest_id = next(iter(self._viewers))
+                self._drop(oldest_id)
+
+    def invalidate(self, user_id):
+        """Forget every pair the user viewed, after they change their preferences or availability"""
+        with self._lock:
+            self._drop(user_id)
+
+    def _drop(self, viewer_id):
+        group = self._viewers.pop(viewer_id, None)
+        if group is not None:
+            self._size -= len(group[1])
+
+
+def init_pair_score_cache(app):
+    """Create the pair score cache and register it on the app"""
+    cache = PairScoreCache(app.config['PAIR_SCORE_CACHE_MAX_ENTRIES'])
+    app.extensions['pair_score_cache'] = cache
+    return cache
+
+
+def pair_score_cache():
+    return current_app.extensions['pair_score_cache']
+
+
+def score_pairs(viewer_id, viewer_stamp, viewer_features, others, features):
+    """Score a viewer against other users in order, computing only pairs not cached.
+
+    others is a list of (user_id, stamp). viewer_features() returns the
+    viewer's (cuisine_mask, slots, max_budget) and features(position) the
+    CandidatePool tuple of others[position]; both are only called on a miss.
+    Returns PoolScores in the order of others.
+    """
+    cache = pair_score_cache()
+    count = len(others)
+    scores = np.zeros(count, dtype=np.int64)
+    timing_match = np.zeros(count, dtype=bool)
+    food_match = np.zeros(count, dtype=bool)
+    common = np.zeros(count, dtype=np.int64)
+
+    missing = []
+    for position, (user_id, stamp) in enumerate(others):
+        cached = cache.get('score', viewer_id, viewer_stamp, user_id, stamp)
+        if cached is None:
+            missing.append(position)
+        else:
+            scores[position], timing_match[position], food_match[position], common[position] = cached
+
+    if missing:
+        pool = CandidatePool(features(position) for position in missing)
+        pool_scores = pool.score(*viewer_features())
+        for row, position in enumerate(missing):
+            scores[position] = pool_scores.scores[row]
+            timing_match[position] = pool_scores.timing_match[row]
+            food_match[position] = pool_scores.food_match[row]
+            common[position] = pool_scores.common_cuisine_counts[row]
+
+            user_id, stamp = others[position]
+            cache.put('score', viewer_id, viewer_stamp, user_id, stamp,
+                      (int(scores[position]), bool(timing_match[position]),
+                       bool(food_match[position]), int(common[position])))
+
+    return PoolScores(scores, timing_match, food_match, common)
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from models.models import db, UserProfile, LunchPreference, Recommendation, matches
+from services.candidates import BATCH_SIZE, load_university_features
+from services.discover_deck import DiscoverDeck, deck_seed
+from services.scoring import CandidatePool
+
+
+def rank_university(university, top_k):
+    """Compute the top_k discover candidates of every user at a university.
+
+    The whole campus is loaded into one pool and each user is scored against
+    it, leaving out the user and anyone they already liked, matched or
+    blocked. Each deck is banded and shuffled with the user's current deck
+    seed. Returns a dict of user id to a ranked DiscoverDeck.
+    """
+    band = current_app.config['DISCOVER_SCORE_BAND']
+    shuffle_period = current_app.config['DISCOVER_SHUFFLE_PERIOD']
+    features = load_university_features(university)
+    pool = CandidatePool(features)
+    positions = {user_id: index for index, user_id in enumerate(pool.user_ids.tolist())}
+    user_ids = list(positions.keys())
+
+    interacted = {}
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        for user_id, matched_user_id in db.session.query(matches.c.user_id, matches.c.matched_user_id).\
+                filter(matches.c.user_id.in_(batch)):
+            if matched_user_id in positions:
+                interacted.setdefault(user_id, []).append(positions[matched_user_id])
+
+    decks = {}
+    for index, (user_id, cuisine_mask, slots, max_budget) in enumerate(features):
+        scores = pool.score(cuisine_mask, slots, max_budget).scores
+
+        eligible = np.ones(len(pool), dtype=bool)
+        eligible[index] = False
+        eligible[interacted.get(user_id, [])] = False
+
+        decks[user_id] = DiscoverDeck.from_scores(pool.user_ids[eligible], scores[eligible], limit=top_k,
+                                                  seed=deck_seed(user_id, shuffle_period), band=band)
+
+    return decks
+
+
+def store_recommendations(decks, computed_at=None):
+    """Replace the stored recommendations of every user in a {user_id: deck} dict"""
+    computed_at = computed_at or datetime.utcnow()
+    user_ids = list(decks.keys())
+
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        Recommendation.query.filter(Recommendation.user_id.in_(batch)).delete(synchronize_session=False)
+        db.session.execute(Recommendation.__table__.insert(), [{
+            'user_id': user_id,
+            'candidate_ids': decks[user_id].user_ids.tobytes(),
+            'scores': decks[user_id].scores.tobytes(),
+            'computed_at': computed_at
+        } for user_id in batch])
+
+
+def _stale(computed_at, max_age):
+    """Condition for stored recommendations that are missing, too old or older than the user's last change"""
+    return or_(
+        computed_at.is_(None),
+        computed_at < datetime.utcnow() - timedelta(seconds=max_age),
+        computed_at < UserProfile.updated_at,
+        and_(LunchPreference.updated_at.isnot(None), computed_at < LunchPreference.updated_at)
+    )
+
+
+def stale_universities(max_age):
+    """Keys of universities with at least one user whose recommendations are missing or stale"""
+    return [row[0] for row in db.session.query(UserProfile.university_key).
+            outerjoin(Recommendation, Recommendation.user_id == UserProfile.user_id).
+            outerjoin(LunchPreference, LunchPreference.user_id == UserProfile.user_id).
+            filter(_stale(Recommendation.computed_at, max_age)).
+            distinct().
+            order_by(UserProfile.university_key)]
+
+
+def recommended_deck(user_id, seen, max_age, seed):
+    """The user's precomputed deck without users already served, or None when it is missing or stale"""
+    row = db.session.query(Recommendation.candidate_ids, Recommendation.scores).\
+        join(UserProfile, UserProfile.user_id == Recommendation.user_id).\
+        outerjoin(LunchPreference, LunchPreference.user_id == Recommendation.user_id).\
+        filter(Recommendation.user_id == user_id, ~_stale(Recommendation.computed_at, max_age)).\
+        first()
+    if row is None:
+        return None
+
+    user_ids = np.frombuffer(row[0], dtype=np.int32)
+    scores = np.frombuffer(row[1], dtype=np.int32)
+    if len(seen):
+        unseen = ~seen.contains(user_ids)
+        user_ids, scores = user_ids[unseen], scores[unseen]
+
+    # Only the top candidates are stored, so the deck is never complete
+    return DiscoverDeck(user_ids, scores, seen=seen, complete=False, seed=seed)
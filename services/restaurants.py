@@ -0,0 +1,141 @@
+import time
+import heapq
+import threading
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models.models import Restaurant
+
+# Read-only copy of a restaurant row, safe to share between requests
+RestaurantEntry = namedtuple('RestaurantEntry', ['id', 'name', 'location', 'cuisine_type', 'price_range', 'rating'])
+
+_index = None
+_index_stale = True
+_index_lock = threading.Lock()
+
+
+def budget_price_cap(max_budget):
+    """Map a budget in dollars to the highest acceptable price range.
+
+    Price ranges go from 1 to 5, with 5 being most expensive:
+    $0-20: 1-2, $20-40: 2-3, $40-60: 3-4, $60+: 4-5
+    """
+    if max_budget is None or max_budget == float('inf'):
+        return None
+    return min(5, int(max_budget / 20) + 1)
+
+
+def _rank(entry):
+    """Sort key for highest rating first, unrated restaurants last, ties by id"""
+    return (entry.rating is None, -(entry.rating or 0), entry.id)
+
+
+class RestaurantIndex:
+    """Process-local restaurant catalog keyed by cuisine and bucketed by price range.
+
+    A restaurant's cuisine_type is split on commas into normalized cuisine
+    names. Each cuisine maps price_range to restaurants sorted by rating, so a
+    lookup only merges the few short lists that can match.
+    """
+
+    def __init__(self, restaurants):
+        self.built_at = time.time()
+        self.by_id = {}
+        self.by_cuisine = {}
+        self._cuisine_keys = {}
+
+        for restaurant in restaurants:
+            entry = RestaurantEntry(restaurant.id, restaurant.name, restaurant.location,
+                                    restaurant.cuisine_type, restaurant.price_range, restaurant.rating)
+            self.by_id[entry.id] = entry
+
+            for cuisine in set(part.strip().lower() for part in (entry.cuisine_type or '').split(',')):
+                if cuisine:
+                    self.by_cuisine.setdefault(cuisine, {}).setdefault(entry.price_range, []).append(entry)
+
+        for buckets in self.by_cuisine.values():
+            for entries in buckets.values():
+                entries.sort(key=_rank)
+
+    def get(self, restaurant_id):
+        return self.by_id.get(restaurant_id)
+
+    def cuisine_keys(self, cuisine):
+        """Indexed cuisines containing the given text, matching the old ilike('%cuisine%') filter"""
+        cuisine = cuisine.lower()
+        keys = self._cuisine_keys.get(cuisine)
+        if keys is None:
+            keys = [key for key in self.by_cuisine if cuisine in key]
+            self._cuisine_keys[cuisine] = keys
+        return keys
+
+    def top(self, cuisines, price_cap, limit):
+        """Top restaurants by rating serving any of the cuisines, within the price cap"""
+        lists = []
+        for cuisine in cuisines:
+            for key in self.cuisine_keys(cuisine):
+                for price_range, entries in self.by_cuisine[key].items():
+                    if price_cap is None or (price_range is not None and price_range <= price_cap):
+                        lists.append(entries)
+
+        picks = []
+        seen = set()
+        for entry in heapq.merge(*lists, key=_rank):
+            if entry.id not in seen:
+                seen.add(entry.id)
+                picks.append(entry)
+                if len(picks) == limit:
+                    break
+        return picks
+
+
+def restaurant_index():
+    """The current restaurant index, rebuilt after restaurant changes or when it gets old"""
+    global _index, _index_stale
+
+    index = _index
+    if index is None or _index_stale or time.time() - index.built_at >= current_app.config['RESTAURANT_INDEX_TTL']:
+        with _index_lock:
+            if _index is index:
+                _index_stale = False
+                _index = RestaurantIndex(Restaurant.query.all())
+            index = _index
+    return index
+
+
+def recommend_restaurants(requests, limit):
+    """Answer many restaurant recommendation requests from the in-memory index.
+
+    Each request is a (cuisines, price_cap) pair, where price_cap is the highest
+    acceptable price range or None for no budget limit. A request matches
+    restaurants whose cuisine_type contains any of its cuisines and gets its
+    top `limit` restaurants by rating.
+    """
+    if not any(cuisines for cuisines, _ in requests):
+        return [[] for _ in requests]
+
+    index = restaurant_index()
+    return [index.top(cuisines, price_cap, limit) if cuisines else [] for cuisines, price_cap in requests]
+
+
+@event.listens_for(Restaurant, 'after_insert')
+@event.listens_for(Restaurant, 'after_update')
+@event.listens_for(Restaurant, 'after_delete')
+def _restaurant_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['restaurants_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _rebuild_after_commit(session):
+    global _index_stale
+    if session.info.pop('restaurants_changed', False):
+        _index_stale = True
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('restaurants_changed', None)
@@ -0,0 +1,98 @@
+import numpy as np
+
+from services.availability import DAYS_PER_WEEK
+from services.bits import byte_popcounts
+
+# Score weights used by the discover feed
+BASE_SCORE = 100
+TIMING_BONUS = 30
+CUISINE_BONUS = 10
+BUDGET_BONUS = 15
+BUDGET_RATIO = 0.8
+
+
+class PoolScores:
+    """Per-candidate compatibility results for a scored pool"""
+
+    def __init__(self, scores, timing_match, food_match, common_cuisine_counts):
+        self.scores = scores
+        self.timing_match = timing_match
+        self.food_match = food_match
+        self.common_cuisine_counts = common_cuisine_counts
+
+
+class CandidatePool:
+    """Candidate features held as NumPy arrays so a whole pool is scored in one pass.
+
+    Each candidate is a (user_id, cuisine_mask, slots, max_budget) tuple where
+    cuisine_mask is LunchPreference.cuisine_mask and slots the candidate's
+    weekly availability as built by services.availability.week_slots.
+    """
+
+    def __init__(self, candidates):
+        candidates = list(candidates)
+        count = len(candidates)
+
+        self.user_ids = np.array([c[0] for c in candidates], dtype=np.int64)
+
+        # One bit per CuisineType, shared by every user
+        self.cuisine_masks = np.array([c[1] or 0 for c in candidates], dtype=np.int64)
+        self.has_cuisines = self.cuisine_masks != 0
+
+        self.availability = np.zeros((count, DAYS_PER_WEEK * 2), dtype=np.int64)
+        for row, candidate in enumerate(candidates):
+            self.availability[row] = candidate[2]
+
+        # Missing or zero budgets never earn the budget bonus
+        self.budgets = np.array([c[3] if c[3] else np.nan for c in candidates], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def take(self, positions):
+        """A new pool of the candidates at the given positions, as an index array or boolean mask"""
+        pool = CandidatePool(())
+        pool.user_ids = self.user_ids[positions]
+        pool.cuisine_masks = self.cuisine_masks[positions]
+        pool.has_cuisines = self.has_cuisines[positions]
+        pool.availability = self.availability[positions]
+        pool.budgets = self.budgets[positions]
+        return pool
+
+    def set(self, row, candidate):
+        """Overwrite the candidate at one position with a new (user_id, cuisine_mask, slots, max_budget) tuple"""
+        self.user_ids[row] = candidate[0]
+        self.cuisine_masks[row] = candidate[1] or 0
+        self.has_cuisines[row] = self.cuisine_masks[row] != 0
+        self.availability[row] = candidate[2]
+        self.budgets[row] = candidate[3] if candidate[3] else np.nan
+
+    def score(self, cuisine_mask, slots, max_budget):
+        """Score every candidate in the pool against one user's cuisine mask, weekly slots and budget"""
+        count = len(self)
+
+        # Timing compatibility: any shared 15-minute slot on the same day
+        timing_match = np.zeros(count, dtype=bool)
+        if slots is not None and np.any(slots) and count:
+            timing_match = np.bitwise_and(self.availability, slots).any(axis=1)
+
+        # Food compatibility: number of shared cuisines
+        common = np.zeros(count, dtype=np.int64)
+        if cuisine_mask and count:
+            shared = np.bitwise_and(self.cuisine_masks, np.int64(cuisine_mask))
+            common = byte_popcounts(shared).reshape(count, 8).sum(axis=1, dtype=np.int64)
+        food_match = common > 0
+
+        # Budget compatibility only applies to candidates with cuisine preferences
+        budget_match = np.zeros(count, dtype=bool)
+        if max_budget and count:
+            with np.errstate(invalid='ignore'):
+                ratio = np.minimum(self.budgets, max_budget) / np.maximum(self.budgets, max_budget)
+                budget_match = (ratio >= BUDGET_RATIO) & self.has_cuisines
+
+        scores = (BASE_SCORE
+                  + TIMING_BONUS * timing_match.astype(np.int64)
+                  + CUISINE_BONUS * common
+                  + BUDGET_BONUS * budget_match.astype(np.int64))
+
+        return PoolScores(scores, timing_match, food_match, common)
@@ -0,0 +1,178 @@
+import numpy as np
+from sqlalchemy import select, func
+
+from models.models import db, SeenContainer, matches
+from services.bits import byte_popcounts
+from services.database import dialect_name
+
+# Containers holding more ids than this switch from a sorted array to a bitmap
+ARRAY_MAX = 4096
+
+# Bytes of a bitmap container, one bit per low 16-bit value
+BITMAP_BYTES = (1 << 16) // 8
+
+# Maximum number of users rebuilt by a single statement
+BATCH_SIZE = 500
+
+
+def container_keys(ids):
+    """Sorted container keys, the upper 16 bits, of a list or array of user ids"""
+    return np.unique(np.asarray(ids, dtype=np.int64) >> 16).tolist()
+
+
+def _bitmap(lows):
+    bitmap = np.zeros(BITMAP_BYTES, dtype=np.uint8)
+    _set_bits(bitmap, lows)
+    return bitmap
+
+
+def _set_bits(bitmap, lows):
+    lows = np.asarray(lows, dtype=np.int64)
+    np.bitwise_or.at(bitmap, lows >> 3, np.left_shift(1, lows & 7).astype(np.uint8))
+
+
+class SeenBitmap:
+    """Roaring-style set of user ids.
+
+    Ids are grouped into containers by their upper 16 bits. A container keeps
+    the low 16 bits of its ids as a sorted uint16 array while it holds at most
+    ARRAY_MAX of them and as a 65536-bit bitmap after that, so no container
+    is larger than 8 KB however many ids it covers.
+    """
+
+    def __init__(self, containers=None):
+        self.containers = containers if containers is not None else {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (high, cardinality, data) rows as stored in SeenContainer"""
+        containers = {}
+        for high, cardinality, data in rows:
+            if cardinality > ARRAY_MAX:
+                containers[high] = np.frombuffer(data, dtype=np.uint8).copy()
+            else:
+                containers[high] = np.frombuffer(data, dtype='<u2').astype(np.uint16)
+        return cls(containers)
+
+    @staticmethod
+    def cardinality(container):
+        if container.dtype == np.uint8:
+            return int(byte_popcounts(container).sum(dtype=np.int64))
+        return len(container)
+
+    def __len__(self):
+        return sum(self.cardinality(container) for container in self.containers.values())
+
+    def row(self, high):
+        """(cardinality, data) of one container as stored in SeenContainer"""
+        container = self.containers[high]
+        data = container.tobytes() if container.dtype == np.uint8 else container.astype('<u2').tobytes()
+        return self.cardinality(container), data
+
+    def add(self, ids):
+        """Add user ids, returning the keys of the containers that changed"""
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        highs = ids >> 16
+        changed = []
+
+        for high in np.unique(highs).tolist():
+            lows = (ids[highs == high] & 0xFFFF).astype(np.uint16)
+            container = self.containers.get(high)
+
+            if container is None:
+                updated = lows
+            elif container.dtype == np.uint16:
+                updated = np.union1d(container, lows).astype(np.uint16)
+            else:
+                updated = container.copy()
+                _set_bits(updated, lows)
+
+            if updated.dtype == np.uint16 and len(updated) > ARRAY_MAX:
+                updated = _bitmap(updated)
+
+            if container is None or self.cardinality(updated) != self.cardinality(container):
+                self.containers[high] = updated
+                changed.append(high)
+
+        return changed
+
+    def contains(self, ids):
+        """Boolean mask telling which of the given ids are in the set"""
+        ids = np.asarray(ids, dtype=np.int64)
+        found = np.zeros(len(ids), dtype=bool)
+        if not self.containers or not len(ids):
+            return found
+
+        highs = ids >> 16
+        lows = ids & 0xFFFF
+        for high, container in self.containers.items():
+            rows = np.flatnonzero(highs == high)
+            if not len(rows):
+                continue
+            if container.dtype == np.uint8:
+                found[rows] = (container[lows[rows] >> 3] >> (lows[rows] & 7).astype(np.uint8)) & 1 == 1
+            elif len(container):
+                positions = np.minimum(np.searchsorted(container, lows[rows]), len(container) - 1)
+                found[rows] = container[positions] == lows[rows]
+        return found
+
+
+def load_seen(user_id, highs=None):
+    """A user's stored seen bitmap, limited to the given container keys when passed"""
+    query = db.session.query(SeenContainer.high, SeenContainer.cardinality, SeenContainer.data).\
+        filter(SeenContainer.user_id == user_id)
+    if highs is not None:
+        query = query.filter(SeenContainer.high.in_(list(highs)))
+    return SeenBitmap.from_rows(query)
+
+
+def add_seen(user_id, seen_ids):
+    """Add swiped user ids to a user's stored seen bitmap in the current transaction.
+
+    Only the containers the ids fall into are read and written. PostgreSQL
+    serializes concurrent updates of one user with a transaction-level
+    advisory lock on the user id; SQLite already serializes writers.
+    """
+    if not len(seen_ids):
+        return
+
+    if dialect_name() == 'postgresql':
+        db.session.execute(select(func.pg_advisory_xact_lock(user_id)))
+
+    bitmap = load_seen(user_id, container_keys(seen_ids))
+    existing = set(bitmap.containers)
+    table = SeenContainer.__table__
+
+    for high in bitmap.add(seen_ids):
+        cardinality, data = bitmap.row(high)
+        if high in existing:
+            db.session.execute(table.update().
+                               where(table.c.user_id == user_id, table.c.high == high).
+                               values(cardinality=cardinality, data=data))
+        else:
+            db.session.execute(table.insert().values(user_id=user_id, high=high, cardinality=cardinality, data=data))
+
+
+def rebuild_seen(user_ids, batch_size=BATCH_SIZE):
+    """Recompute the stored seen bitmaps of some users from their matches rows, without committing"""
+    user_ids = list(user_ids)
+    table = SeenContainer.__table__
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+
+        swiped = {user_id: [] for user_id in batch}
+        for user_id, matched_user_id in db.session.query(matches.c.user_id, matches.c.matched_user_id).\
+                filter(matches.c.user_id.in_(batch)):
+            swiped[user_id].append(matched_user_id)
+
+        rows = []
+        for user_id, seen_ids in swiped.items():
+            bitmap = SeenBitmap()
+            for high in bitmap.add(seen_ids):
+                cardinality, data = bitmap.row(high)
+                rows.append({'user_id': user_id, 'high': high, 'cardinality': cardinality, 'data': data})
+
+        db.session.execute(table.delete().where(table.c.user_id.in_(batch)))
+        if rows:
+            db.session.execute(table.insert(), rows)
@@ -0,0 +1,82 @@
+from sqlalchemy import and_, or_, case, exists, false, func, literal, select
+from sqlalchemy.orm import aliased
+
+from models.models import db, UserProfile, LunchPreference, AvailabilityBitmap, normalize_university
+from services.availability import slots_overlap
+from services.candidates import not_interacted
+from services.scoring import BASE_SCORE, TIMING_BONUS, CUISINE_BONUS, BUDGET_BONUS, BUDGET_RATIO
+from services.bits import sql_popcount
+
+
+def timing_match(viewer_id, candidate_id):
+    """SQL condition for a candidate sharing any stored availability slot with the viewer"""
+    candidate_bitmap = aliased(AvailabilityBitmap)
+    viewer_bitmap = aliased(AvailabilityBitmap)
+    return exists().where(
+        candidate_bitmap.user_id == candidate_id,
+        viewer_bitmap.user_id == viewer_id,
+        viewer_bitmap.day_of_week == candidate_bitmap.day_of_week,
+        slots_overlap(candidate_bitmap, viewer_bitmap)
+    )
+
+
+def common_cuisine_count(cuisine_mask, candidate_mask):
+    """SQL expression counting the cuisines a candidate mask shares with the viewer's mask"""
+    if not cuisine_mask:
+        return literal(0)
+    shared = func.coalesce(candidate_mask, 0).op('&')(cuisine_mask)
+    return sql_popcount(shared, cuisine_mask.bit_length())
+
+
+def budget_match(max_budget, candidate_budget, candidate_mask):
+    """SQL condition for budgets within BUDGET_RATIO, only for candidates with cuisine preferences"""
+    if not max_budget:
+        return false()
+    candidate_budget = func.nullif(candidate_budget, 0)
+    ratio = case((candidate_budget < max_budget, candidate_budget / max_budget),
+                 else_=literal(float(max_budget)) / candidate_budget)
+    return and_(candidate_budget.isnot(None), func.coalesce(candidate_mask, 0) != 0, ratio >= BUDGET_RATIO)
+
+
+def score_expression(viewer_id, cuisine_mask, max_budget, candidate_id=UserProfile.user_id,
+                     candidate_preference=LunchPreference):
+    """The discover compatibility score as one SQL expression, matching CandidatePool.score.
+
+    The viewer's cuisine mask and budget are bound as parameters and their
+    availability is read from their stored bitmaps. Candidate columns come
+    from candidate_preference, which the query must outer join.
+    """
+    return (BASE_SCORE
+            + TIMING_BONUS * case((timing_match(viewer_id, candidate_id), 1), else_=0)
+            + CUISINE_BONUS * common_cuisine_count(cuisine_mask, candidate_preference.cuisine_mask)
+            + BUDGET_BONUS * case((budget_match(max_budget, candidate_preference.max_budget,
+                                                candidate_preference.cuisine_mask), 1), else_=0))
+
+
+def ranked_candidates(viewer_id, university, cuisine_mask, max_budget, limit=None, after=None):
+    """Score a viewer's discover candidates in the database and return the best (user_id, score) rows.
+
+    Rows come highest score first with ties by user id. Users the viewer has
+    interacted with are left out. after is the (score, user_id) of the last
+    row of a previous page, to read the page that follows it.
+    """
+    scored = select(
+        UserProfile.user_id.label('user_id'),
+        score_expression(viewer_id, cuisine_mask, max_budget).label('score')
+    ).\
+        outerjoin(LunchPreference, LunchPreference.user_id == UserProfile.user_id).\
+        where(
+            UserProfile.university_key == normalize_university(university),
+            UserProfile.user_id != viewer_id,
+            not_interacted(viewer_id, UserProfile.user_id)
+        ).\
+        subquery('scored')
+
+    query = select(scored.c.user_id, scored.c.score).order_by(scored.c.score.desc(), scored.c.user_id)
+    if after is not None:
+        score, user_id = after
+        query = query.where(or_(scored.c.score < score, and_(scored.c.score == score, scored.c.user_id > user_id)))
+    if limit is not None:
+        query = query.limit(limit)
+
+    return db.session.execute(query).all()
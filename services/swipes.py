@@ -0,0 +1,163 @@
+from datetime import datetime
+from sqlalchemy import and_, or_, insert, select, func, values, column, Integer
+
+from models.models import db, User, UserProfile, Notification, matches
+from services.database import dialect_name, insert_ignore, supports_update_returning
+from services.seen import add_seen
+
+# matches.status written for each swipe action
+SWIPE_STATUSES = {'like': 'pending', 'skip': 'blocked', 'block': 'blocked'}
+
+def _lock_pairs(viewer_id, user_ids):
+    """Serialize likes between the viewer and each user until the transaction ends.
+
+    Two users liking each other at the same moment would otherwise each miss
+    the other's uncommitted row. PostgreSQL takes one transaction-level
+    advisory lock per pair, in a fixed order so batches cannot deadlock.
+    MySQL locks the users rows of the viewer and every user, in id order.
+    SQLite already serializes writers, so it needs no lock.
+    """
+    if not user_ids:
+        return
+
+    dialect = dialect_name()
+    if dialect == 'mysql':
+        db.session.execute(
+            select(User.id).where(User.id.in_(sorted(set(user_ids) | {viewer_id}))).
+            order_by(User.id).with_for_update()
+        )
+        return
+    if dialect != 'postgresql':
+        return
+
+    keys = sorted(set((min(viewer_id, user_id), max(viewer_id, user_id)) for user_id in user_ids))
+    pairs = values(column('low', Integer), column('high', Integer), name='pairs').data(keys)
+    db.session.execute(
+        select(func.pg_advisory_xact_lock(pairs.c.low, pairs.c.high)).order_by(pairs.c.low, pairs.c.high)
+    )
+
+
+def _insert_swipes(viewer_id, statuses, now):
+    """Insert a matches row per swipe in one statement, keeping rows that already exist"""
+    db.session.execute(insert_ignore(matches).values([
+        {'user_id': viewer_id, 'matched_user_id': user_id, 'status': status, 'created_at': now}
+        for user_id, status in statuses.items()
+    ]))
+
+
+def _match_pairs(viewer_id, user_ids, now):
+    """Flip every pending pair where the viewer and the user like each other to matched.
+
+    Both directions are updated by one statement, which only touches a row
+    while its reverse row is pending too. MySQL can neither return updated
+    rows nor read the updated table in a subquery, so there the pending rows
+    are selected first and the mutual pairs updated by key. Returns the ids
+    of the users matched.
+    """
+    if not supports_update_returning():
+        return _match_pairs_selected(viewer_id, user_ids, now)
+
+    reverse = matches.alias('reverse_match')
+    reverse_status = select(reverse.c.status).where(
+        reverse.c.user_id == matches.c.matched_user_id,
+        reverse.c.matched_user_id == matches.c.user_id
+    ).scalar_subquery()
+
+    rows = db.session.execute(matches.update().where(
+        or_(
+            and_(matches.c.user_id == viewer_id, matches.c.matched_user_id.in_(user_ids)),
+            and_(matches.c.user_id.in_(user_ids), matches.c.matched_user_id == viewer_id)
+        ),
+        matches.c.status == 'pending',
+        reverse_status == 'pending'
+    ).values(status='matched', matched_date=now).returning(matches.c.user_id, matches.c.matched_user_id))
+
+    return sorted(matched_user_id for user_id, matched_user_id in rows if user_id == viewer_id)
+
+
+def _match_pairs_selected(viewer_id, user_ids, now):
+    """_match_pairs for databases without UPDATE ... RETURNING"""
+    pending = db.session.execute(select(matches.c.user_id, matches.c.matched_user_id).where(
+        or_(
+            and_(matches.c.user_id == viewer_id, matches.c.matched_user_id.in_(user_ids)),
+            and_(matches.c.user_id.in_(user_ids), matches.c.matched_user_id == viewer_id)
+        ),
+        matches.c.status == 'pending'
+    ).with_for_update()).all()
+
+    liked = set(matched_user_id for user_id, matched_user_id in pending if user_id == viewer_id)
+    matched_ids = sorted(user_id for user_id, matched_user_id in pending
+                         if matched_user_id == viewer_id and user_id in liked)
+    if not matched_ids:
+        return []
+
+    db.session.execute(matches.update().where(
+        or_(
+            and_(matches.c.user_id == viewer_id, matches.c.matched_user_id.in_(matched_ids)),
+            and_(matches.c.user_id.in_(matched_ids), matches.c.matched_user_id == viewer_id)
+        )
+    ).values(status='matched', matched_date=now))
+
+    return matched_ids
+
+
+def record_swipes(viewer, decisions):
+    """Record many (user_id, action) swipe decisions from one user in a single pass.
+
+    Decisions for unknown users or for the viewer themself are ignored, as is
+    any later decision for the same user. Rows already in matches are kept as
+    they are. New rows go in with one multi-row insert and are added to the
+    viewer's seen bitmap, every liked pair that is now mutual is flipped to
+    matched by one statement, and the match notifications are inserted in
+    bulk. The caller commits.
+
+    Returns the ids of the users the viewer matched with.
+    """
+    statuses = {}
+    for user_id, action in decisions:
+        if user_id != viewer.id and action in SWIPE_STATUSES:
+            statuses.setdefault(user_id, SWIPE_STATUSES[action])
+
+    if not statuses:
+        return []
+
+    first_names = dict(db.session.query(User.id, UserProfile.first_name).
+                       join(UserProfile, UserProfile.user_id == User.id).
+                       filter(User.id.in_(list(statuses.keys()))))
+
+    statuses = {user_id: status for user_id, status in statuses.items() if user_id in first_names}
+    if not statuses:
+        return []
+
+    now = datetime.now()
+    liked_ids = [user_id for user_id, status in statuses.items() if status == 'pending']
+
+    _lock_pairs(viewer.id, liked_ids)
+    _insert_swipes(viewer.id, statuses, now)
+    add_seen(viewer.id, list(statuses.keys()))
+
+    # Likes that were already recorded are checked too, so a pair left
+    # pending on both sides still becomes a match
+    matched_ids = _match_pairs(viewer.id, liked_ids, now) if liked_ids else []
+    if not matched_ids:
+        return []
+
+    notifications = []
+    for user_id in matched_ids:
+        notifications.append({
+            'user_id': viewer.id,
+            'notification_type': 'match',
+            'related_user_id': user_id,
+            'message': f"You matched with {first_names[user_id]}! You can now message each other.",
+            'is_read': False
+        })
+        notifications.append({
+            'user_id': user_id,
+            'notification_type': 'match',
+            'related_user_id': viewer.id,
+            'message': f"You matched with {viewer.profile.first_name}! You can now message each other.",
+            'is_read': False
+        })
+    db.session.execute(insert(Notification), notifications)
+
+    return matched_ids
@@ -0,0 +1,143 @@
+import threading
+from datetime import datetime
+from collections import OrderedDict, namedtuple
+from flask import current_app
+
+from models.models import db, UserProfile, LunchPreference
+from services.candidates import load_users_with_collections, not_interacted
+
+# Read-only copies of the rows a discover card shows, safe to share between requests
+CardUser = namedtuple('CardUser', ['id', 'email', 'availability'])
+CardProfile = namedtuple('CardProfile', ['first_name', 'last_name', 'university', 'department', 'bio', 'graduation_year'])
+CardPhoto = namedtuple('CardPhoto', ['id', 'photo_path', 'is_primary'])
+CardPreferences = namedtuple('CardPreferences', ['id', 'max_budget', 'cuisine_mask', 'cuisine_preferences', 'dietary_restrictions'])
+CardCuisine = namedtuple('CardCuisine', ['cuisine_type'])
+CardRestriction = namedtuple('CardRestriction', ['restriction_type'])
+CardAvailability = namedtuple('CardAvailability', ['day_of_week', 'start_time', 'end_time'])
+
+
+class UserCard(namedtuple('UserCard', ['stamp', 'user', 'profile', 'photos', 'photo_url', 'preferences'])):
+    """Viewer-independent view model of a discover card.
+
+    The stamp is the (UserProfile.version, LunchPreference.version) pair the
+    card was built from, so a card is only reused while both are unchanged.
+    """
+    __slots__ = ()
+
+
+def card_from_candidate(data, stamp):
+    """Build a card from a candidate loaded by attach_collections"""
+    user = data['user']
+    profile = data['profile']
+    preference = data['preference']
+
+    # Find primary photo
+    photos = [CardPhoto(photo.id, photo.photo_path, photo.is_primary) for photo in data['photos']]
+    primary_photo = next((photo for photo in photos if photo.is_primary), None)
+    photo_url = primary_photo.photo_path if primary_photo else 'images/default-profile.png'
+
+    preferences = None
+    if preference is not None:
+        preferences = CardPreferences(
+            preference.id,
+            preference.max_budget,
+            preference.cuisine_mask,
+            [CardCuisine(cp.cuisine_type) for cp in data['cuisines']],
+            [CardRestriction(dr.restriction_type) for dr in data['restrictions']]
+        )
+
+    return UserCard(
+        stamp,
+        CardUser(user.id, user.email,
+                 [CardAvailability(a.day_of_week, a.start_time, a.end_time) for a in data['availabilities']]),
+        CardProfile(profile.first_name, profile.last_name, profile.university,
+                    profile.department, profile.bio, profile.graduation_year),
+        photos,
+        photo_url,
+        preferences
+    )
+
+
+class CardCache:
+    """Process-local LRU of user cards, keyed by user id and checked against the card stamp"""
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, stamp):
+        with self._lock:
+            card = self._entries.get(user_id)
+            if card is None:
+                return None
+            if card.stamp != stamp:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return card
+
+    def put(self, card):
+        with self._lock:
+            self._entries[card.user.id] = card
+            self._entries.move_to_end(card.user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+def init_card_cache(app):
+    """Create the user card cache and register it on the app"""
+    cache = CardCache(app.config['USER_CARD_CACHE_MAX_ENTRIES'])
+    app.extensions['user_card_cache'] = cache
+    return cache
+
+
+def card_cache():
+    return current_app.extensions['user_card_cache']
+
+
+def load_cards(viewer_id, user_ids):
+    """Cards for the given users in order, leaving out anyone the viewer has interacted with.
+
+    A single query reads the current stamps, which also drops interacted and
+    deleted users. Cards cached under the same stamps are reused, so only new
+    or changed users have their collections loaded.
+    """
+    if not user_ids:
+        return []
+
+    stamps = {}
+    for user_id, profile_version, preference_version in db.session.query(
+            UserProfile.user_id, UserProfile.version, LunchPreference.version).\
+            outerjoin(LunchPreference, LunchPreference.user_id == UserProfile.user_id).\
+            filter(UserProfile.user_id.in_(user_ids), not_interacted(viewer_id, UserProfile.user_id)):
+        stamps[user_id] = (profile_version, preference_version)
+
+    cache = card_cache()
+    cards = {}
+    for user_id, stamp in stamps.items():
+        card = cache.get(user_id, stamp)
+        if card is not None:
+            cards[user_id] = card
+
+    missing_ids = [user_id for user_id in user_ids if user_id in stamps and user_id not in cards]
+    for data in load_users_with_collections(missing_ids):
+        card = card_from_candidate(data, stamps[data['user'].id])
+        cache.put(card)
+        cards[card.user.id] = card
+
+    return [cards[user_id] for user_id in user_ids if user_id in cards]
+
+
+def touch_card(user):
+    """Mark a user's card as changed after an edit to their photos or availability.
+
+    Writing updated_at makes the profile row's UPDATE bump its version.
+    """
+    if user.profile is not None:
+        user.profile.updated_at = datetime.utcnow()
+    card_cache().invalidate(user.id)
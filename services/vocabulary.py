@@ -0,0 +1,215 @@
+import threading
+from collections import Counter
+from sqlalchemy import event, select, update, func, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from models.models import db, LunchPreference, CuisinePreference, CuisineType
+from services.database import insert_ignore
+
+# cuisine_mask is a signed BIGINT column, so the vocabulary has 63 usable bits
+MAX_VOCABULARY_SIZE = 63
+
+# Maximum number of preference ids refreshed by a single statement
+BATCH_SIZE = 500
+
+# Cuisines offered by the preferences form. Each is given a mask bit when the
+# vocabulary is seeded, so only append to this list.
+CUISINE_NAMES = [
+    "American", "Italian", "Mexican", "Chinese", "Japanese", "Thai", "Indian", "Greek", "Mediterranean",
+    "French", "German", "Korean", "Vietnamese", "Caribbean", "Spanish", "Middle Eastern",
+    "Ethiopian", "Turkish", "Peruvian", "Brazilian", "Filipino"
+]
+
+# Dietary restrictions offered by the preferences form
+RESTRICTION_NAMES = [
+    "Vegetarian", "Vegan", "Gluten-Free", "Dairy-Free", "Nut-Free", "Halal", "Kosher",
+    "Pescatarian", "Keto", "Low-Carb", "Low-Fat", "Low-Sodium"
+]
+
+
+class VocabularyFull(ValueError):
+    """Raised when seeding a cuisine would need a bit past MAX_VOCABULARY_SIZE"""
+
+
+def normalize_name(name):
+    """Canonical form used to match names: lowercase with single spaces"""
+    return ' '.join(name.split()).lower()
+
+
+class Choices:
+    """A curated list of names that users pick from.
+
+    Names are matched by their normalized form. Names users saved that are not
+    in the list are kept as entered.
+    """
+
+    def __init__(self, names):
+        self.choices = list(names)
+        self._choice_names = {normalize_name(name): name for name in self.choices}
+
+    def resolve(self, names):
+        """Display names for user input: the listed spelling of curated names, others as entered, without duplicates"""
+        resolved = {}
+        for name in names:
+            normalized_name = normalize_name(name)
+            if normalized_name:
+                resolved.setdefault(normalized_name, self._choice_names.get(normalized_name, name.strip()))
+        return list(resolved.values())
+
+    def form_choices(self, selected=()):
+        """(value, label) pairs for a form field: the curated names, then any selected names not among them"""
+        return [(name, name) for name in self.resolve(self.choices + list(selected))]
+
+
+class CuisineVocabulary(Choices):
+    """Process-local view of the cuisine_types table, mapping cuisines to bits of LunchPreference.cuisine_mask.
+
+    The table holds the curated cuisines, added by seed() with dense ids
+    starting at 1, and entry n owns bit n-1 of the mask. Other names have no
+    bit. The cache is reloaded when it meets an unknown curated name or bit.
+    """
+
+    table = CuisineType.__table__
+
+    def __init__(self):
+        super().__init__(CUISINE_NAMES)
+        self._by_name = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._by_name = {}
+            self._by_id = {}
+
+    def _reload(self, session):
+        rows = session.execute(select(self.table.c.id, self.table.c.name, self.table.c.normalized_name)).all()
+        with self._lock:
+            self._by_name = {normalized_name: entry_id for entry_id, name, normalized_name in rows}
+            self._by_id = {entry_id: (name, normalized_name) for entry_id, name, normalized_name in rows}
+
+    def _insert(self, session, name, normalized_name):
+        """Add one entry under the next free id, retrying if another writer took it"""
+        while True:
+            next_id = session.execute(select(func.coalesce(func.max(self.table.c.id), 0) + 1)).scalar()
+            if next_id > MAX_VOCABULARY_SIZE:
+                raise VocabularyFull(f"Cannot add '{name}': the list of cuisine types is full.")
+
+            session.execute(insert_ignore(self.table, session).values(
+                id=next_id, name=name, normalized_name=normalized_name
+            ))
+            session.info['vocabulary_changed'] = True
+
+            existing = session.execute(select(self.table.c.id).where(
+                self.table.c.normalized_name == normalized_name)).scalar()
+            if existing is not None:
+                return
+
+    def seed(self, session=None):
+        """Add the curated cuisines missing from the table. Runs in the current transaction."""
+        session = session or db.session
+        self._reload(session)
+        missing = [(normalized_name, name) for normalized_name, name in self._choice_names.items()
+                   if normalized_name not in self._by_name]
+        for normalized_name, name in missing:
+            self._insert(session, name, normalized_name)
+        if missing:
+            self._reload(session)
+
+    def ids(self, names, session=None):
+        """Map names to vocabulary ids keyed by normalized name, dropping names without a bit"""
+        wanted = set(normalize_name(name) for name in names)
+        wanted.discard('')
+
+        # Names outside the curated list are never added, so they need no reload
+        if not self._by_name or any(normalized_name not in self._by_name and normalized_name in self._choice_names
+                                    for normalized_name in wanted):
+            self._reload(session or db.session)
+
+        return {normalized_name: self._by_name[normalized_name]
+                for normalized_name in wanted if normalized_name in self._by_name}
+
+    def names(self, mask, session=None):
+        """Sorted normalized names of the bits set in a mask"""
+        entry_ids = [bit + 1 for bit in range(MAX_VOCABULARY_SIZE) if mask >> bit & 1]
+        if any(entry_id not in self._by_id for entry_id in entry_ids):
+            self._reload(session or db.session)
+        return sorted(self._by_id[entry_id][1] for entry_id in entry_ids if entry_id in self._by_id)
+
+
+CUISINES = CuisineVocabulary()
+RESTRICTIONS = Choices(RESTRICTION_NAMES)
+
+
+def refresh_cuisine_masks(preference_ids, session=None):
+    """Recompute the cuisine masks of some lunch preferences from their cuisine rows.
+
+    Cuisines outside the vocabulary leave no bit. Runs in the current
+    transaction without committing. Returns a Counter of the normalized names
+    that had no bit, by number of rows.
+    """
+    session = session or db.session
+    preference_ids = list(preference_ids)
+    preferences = LunchPreference.__table__
+    items = CuisinePreference.__table__
+    unmapped = Counter()
+
+    for start in range(0, len(preference_ids), BATCH_SIZE):
+        batch = preference_ids[start:start + BATCH_SIZE]
+        rows = session.execute(select(items.c.lunch_preference_id, items.c.cuisine_type).
+                               where(items.c.lunch_preference_id.in_(batch))).all()
+        ids = CUISINES.ids([name for _, name in rows], session=session)
+
+        masks = {preference_id: 0 for preference_id in batch}
+        for preference_id, name in rows:
+            entry_id = ids.get(normalize_name(name))
+            if entry_id is None:
+                unmapped[normalize_name(name)] += 1
+            else:
+                masks[preference_id] |= 1 << (entry_id - 1)
+
+        session.execute(
+            update(preferences).where(preferences.c.id == bindparam('preference_id')).
+            values(cuisine_mask=bindparam('new_cuisine_mask')),
+            [{'preference_id': preference_id, 'new_cuisine_mask': mask} for preference_id, mask in masks.items()]
+        )
+
+        # Keep loaded preferences in step with the rows just written
+        for preference_id, mask in masks.items():
+            preference = session.identity_map.get(identity_key(LunchPreference, preference_id))
+            if preference is not None:
+                set_committed_value(preference, 'cuisine_mask', mask)
+
+    return unmapped
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_after_flush(session, flush_context):
+    preference_ids = set()
+    removed_ids = set()
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, LunchPreference):
+            preference_ids.add(obj.id)
+        elif isinstance(obj, CuisinePreference):
+            preference_ids.add(obj.lunch_preference_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, LunchPreference):
+            removed_ids.add(obj.id)
+        elif isinstance(obj, CuisinePreference):
+            preference_ids.add(obj.lunch_preference_id)
+
+    preference_ids -= removed_ids
+    preference_ids.discard(None)
+    if preference_ids:
+        refresh_cuisine_masks(sorted(preference_ids), session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    # Entries read or added inside the rolled back transaction may not exist
+    if session.info.pop('vocabulary_changed', False):
+        CUISINES.clear()
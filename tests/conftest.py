@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Add parent directory to path so we can import from there
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests run against TEST_DATABASE_URI, or a throwaway SQLite file when it is not set
+os.environ['DATABASE_URI'] = os.getenv('TEST_DATABASE_URI', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db'))
+
+from app import create_app
+
+@pytest.fixture(scope='session')
+def app():
+    """One app for the whole run, as used by pytest-flask's client fixture"""
+    app = create_app('testing')
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
@@ -0,0 +1,81 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+
+from models.models import db, matches
+from script.seed_campus import seed_campus, remove_campus
+
+CHECK_UNIVERSITY = "Query Check University"
+
+# Likes and matches given to one user per size
+SIZES = [5, 50, 300]
+
+# Most queries the matched list may run, whatever the number of matches: the
+# login user, the list join, one query per collection in attach_collections
+# and the current user's preferences, cuisines and availability, plus a
+# possible reload of the restaurant index
+MATCHED_QUERY_BOUND = 11
+
+def add_swipes(user_id, liked_ids, matched_ids):
+    """Give a user pending likes and matches, half of the matches without a matched_date"""
+    now = datetime.now()
+    rows = [{'user_id': user_id, 'matched_user_id': liked_id, 'status': 'pending', 'created_at': now}
+            for liked_id in liked_ids]
+    for index, matched_id in enumerate(matched_ids):
+        matched_date = now if index % 2 else None
+        rows.append({'user_id': user_id, 'matched_user_id': matched_id, 'status': 'matched',
+                     'matched_date': matched_date, 'created_at': now})
+        rows.append({'user_id': matched_id, 'matched_user_id': user_id, 'status': 'matched',
+                     'matched_date': matched_date, 'created_at': now})
+    db.session.execute(matches.insert(), rows)
+    db.session.commit()
+
+def count_queries(app, user_id, path):
+    """Render a page as the given user and return the number of SQL statements it ran"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    counter = {'queries': 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert response.status_code == 200
+    return counter['queries']
+
+@pytest.fixture(scope='module')
+def query_counts(app):
+    """Queries run by each list page, keyed by path and then by the user's number of likes and matches"""
+    with app.app_context():
+        remove_campus(CHECK_UNIVERSITY)
+        user_ids = seed_campus(CHECK_UNIVERSITY, len(SIZES) + 2 * max(SIZES))
+        others = user_ids[len(SIZES):]
+        for user_id, size in zip(user_ids, SIZES):
+            add_swipes(user_id, others[:size], others[size:2 * size])
+
+    counts = {'/matching/liked': {}, '/matching/matched': {}}
+    for user_id, size in zip(user_ids, SIZES):
+        for path in counts:
+            counts[path][size] = count_queries(app, user_id, path)
+
+    yield counts
+    with app.app_context():
+        remove_campus(CHECK_UNIVERSITY)
+
+def test_liked_list_query_count_is_constant(query_counts):
+    """The liked list runs the same queries for 5 likes as for 300"""
+    assert len(set(query_counts['/matching/liked'].values())) == 1
+
+@pytest.mark.parametrize('size', SIZES)
+def test_matched_list_query_count_is_bounded(query_counts, size):
+    assert query_counts['/matching/matched'][size] <= MATCHED_QUERY_BOUND
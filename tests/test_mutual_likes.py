@@ -0,0 +1,87 @@
+import threading
+import pytest
+from sqlalchemy import and_, or_
+
+from models.models import db, User, Notification, matches
+from services.swipes import record_swipes
+from script.seed_campus import seed_campus, remove_campus
+
+STRESS_UNIVERSITY = "Stress Test University"
+
+# User pairs that like each other, and how many pairs do so at the same moment
+PAIRS = 100
+CONCURRENCY = 8
+
+def like(app, barrier, errors, viewer_id, user_id):
+    """Like a user from a worker thread once every thread in the round is ready"""
+    with app.app_context():
+        try:
+            viewer = db.session.get(User, viewer_id)
+            viewer.profile
+            # Hand the connection back so waiting threads do not exhaust the pool
+            db.session.close()
+            barrier.wait(timeout=60)
+            record_swipes(viewer, [(user_id, 'like')])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.append(f"{viewer_id} -> {user_id}: {e}")
+
+def run_round(app, pairs):
+    """Have both users of every pair like each other at the same moment"""
+    barrier = threading.Barrier(len(pairs) * 2)
+    errors = []
+    threads = []
+    for first_id, second_id in pairs:
+        threads.append(threading.Thread(target=like, args=(app, barrier, errors, first_id, second_id)))
+        threads.append(threading.Thread(target=like, args=(app, barrier, errors, second_id, first_id)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+def lost_matches(pairs):
+    """Pairs that did not end up matched with exactly one notification each way"""
+    failed = []
+    for first_id, second_id in pairs:
+        statuses = [row[0] for row in db.session.query(matches.c.status).filter(or_(
+            and_(matches.c.user_id == first_id, matches.c.matched_user_id == second_id),
+            and_(matches.c.user_id == second_id, matches.c.matched_user_id == first_id)
+        ))]
+        notifications = Notification.query.filter(
+            Notification.notification_type == 'match',
+            or_(
+                and_(Notification.user_id == first_id, Notification.related_user_id == second_id),
+                and_(Notification.user_id == second_id, Notification.related_user_id == first_id)
+            )
+        ).count()
+        if statuses != ['matched', 'matched'] or notifications != 2:
+            failed.append((first_id, second_id, statuses, notifications))
+    return failed
+
+@pytest.fixture
+def pairs(app):
+    """Pairs of freshly seeded users, removed again afterwards"""
+    with app.app_context():
+        remove_campus(STRESS_UNIVERSITY)
+        user_ids = seed_campus(STRESS_UNIVERSITY, PAIRS * 2)
+    yield list(zip(user_ids[0::2], user_ids[1::2]))
+    with app.app_context():
+        remove_campus(STRESS_UNIVERSITY)
+
+def test_simultaneous_mutual_likes_never_lose_a_match(app, pairs):
+    """Both users of a pair liking each other at once must end up matched.
+
+    SQLite serializes writers, so the pair locking is only exercised with
+    TEST_DATABASE_URI pointing at PostgreSQL or MySQL.
+    """
+    errors = []
+    for start in range(0, len(pairs), CONCURRENCY):
+        errors.extend(run_round(app, pairs[start:start + CONCURRENCY]))
+
+    with app.app_context():
+        failed = lost_matches(pairs)
+
+    assert errors == []
+    assert failed == []